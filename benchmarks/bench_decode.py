@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Time decoding a CTS602 datapoint response, through the whole adapter and through the struct decoder alone.
+
+The headline is the adapter path as the client runs it on every response, with history, deadband and
+tier bookkeeping: once for a response repeating the last values, the common case, and once with every
+value changed. The per-value loop from before the struct decoder is the baseline.
+"""
+import argparse
+import json
+import sys
+import timeit
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "vendor"))
+
+from genvexnabto.genvexnabto_history import GenvexNabtoHistory  # noqa: E402
+from genvexnabto.genvexnabto_modeladapter import GenvexNabtoModelAdapter  # noqa: E402
+
+
+def _legacy_decode(adapter: GenvexNabtoModelAdapter, keys, payload) -> list:
+    # The decode loop as it was before the struct decoder, kept here as the baseline
+    datapoints = adapter._loadedModel._datapoints
+    values = []
+    length = int.from_bytes(payload[0:2], "big")
+    for position in range(length):
+        key = keys[position]
+        value = int.from_bytes(payload[2 + position * 2:4 + position * 2], "big", signed=True) + datapoints[key]["offset"]
+        if datapoints[key]["divider"] > 1:
+            value /= datapoints[key]["divider"]
+        values.append(value)
+    return values
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=20000, help="Decodes per timing run")
+    args = parser.parse_args()
+
+    adapter = GenvexNabtoModelAdapter(1140, 0, 2763306, 3)  # Nilan CTS602
+    adapter.setHistory(GenvexNabtoHistory())
+    keys = tuple(adapter._loadedModel.getDefaultDatapointRequest())
+    payloads = [
+        len(keys).to_bytes(2, "big") + b"".join((position * 7 + shift).to_bytes(2, "big") for position in range(len(keys)))
+        for shift in (0, 40)
+    ]
+    payload = payloads[0]
+
+    decoder = adapter.getDatapointDecoder(keys)
+    count = int.from_bytes(payload[0:2], "big")
+    assert decoder.decode(payload, 2, count) == _legacy_decode(adapter, keys, payload)
+
+    def timed(function) -> float:
+        return min(timeit.repeat(function, number=args.number, repeat=5)) / args.number * 1e6
+
+    legacy = timed(lambda: _legacy_decode(adapter, keys, payload))
+    struct_decoder = timed(lambda: decoder.decode(payload, 2, count))
+    # Keys are passed in, as the adapter's scheduler moves unchanged keys out of their request list
+    repeated = timed(lambda: adapter.decodeDatapoints(keys, payload))
+    calls = iter(range(args.number * 5))
+    changing = timed(lambda: adapter.decodeDatapoints(keys, payloads[next(calls) % 2]))
+    last = payloads[(args.number * 5 - 1) % 2]
+    if [adapter.getValue(key) for key in keys] != decoder.decode(last, 2, count):
+        raise RuntimeError("decodeDatapoints did not decode the last payload")
+    print(json.dumps({
+        "benchmark": "decode_datapoints",
+        "keys": len(keys),
+        "number": args.number,
+        "adapter_us_per_decode": round(repeated, 3),
+        "adapter_changed_us_per_decode": round(changing, 3),
+        "legacy_us_per_decode": round(legacy, 3),
+        "struct_us_per_decode": round(struct_decoder, 3),
+        "speedup": round(legacy / repeated, 2),
+        "struct_speedup": round(legacy / struct_decoder, 2),
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
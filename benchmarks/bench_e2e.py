@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""End-to-end client benchmarks against the local simulator, emitted as one JSON document.
+
+Measures cold probe latency per phase (discover, connect, model, first data), steady-state poll and setpoint write latency,
+packets per poll, thread/fd/RSS growth over repeated polls and probes, and the
+throughput of decodeDatapoints. Compare the JSON of two runs to spot regressions.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import timeit
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "vendor"))
+sys.path.insert(0, str(REPO_ROOT))
+
+from genvexnabto import GenvexNabto, GenvexNabtoSetpointKey  # noqa: E402
+from genvexnabto.genvexnabto_modeladapter import GenvexNabtoModelAdapter  # noqa: E402
+from nilan_simulator import DEFAULT_DEVICE_ID, FINGERPRINTS, NilanSimulator  # noqa: E402
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+
+def _summary(samples: list) -> dict:
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "min_ms": _ms(ordered[0]),
+        "median_ms": _ms(statistics.median(ordered)),
+        "p95_ms": _ms(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]),
+        "max_ms": _ms(ordered[-1]),
+    }
+
+
+def _resources() -> dict:
+    """Threads, open file descriptors and resident memory of this process, where the platform tells."""
+    fds = None
+    rss_kb = None
+    if os.path.isdir("/proc/self/fd"):
+        fds = len(os.listdir("/proc/self/fd"))
+    try:
+        with open("/proc/self/statm", "r", encoding="ascii") as f:
+            rss_kb = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {"threads": threading.active_count(), "fds": fds, "rss_kb": rss_kb}
+
+
+def _growth(before: dict, after: dict) -> dict:
+    return {key: (after[key] - before[key]) if after[key] is not None and before[key] is not None else None for key in before}
+
+
+async def _cold_probe(host: str, port: int) -> dict:
+    """Discover, connect, load the model and wait for first data on a fresh client, timing each phase."""
+    client = GenvexNabto("bench@example.com")
+    client.setDiscoveryTarget(host, port)
+    start = time.perf_counter()
+    try:
+        await client.startListening()
+        client.setDevice(DEFAULT_DEVICE_ID)
+        if not await client.waitForDiscovery():
+            raise RuntimeError("simulator was not discovered")
+        client.connectToDevice()
+        await client.waitForConnection()
+        if client._connection_error:
+            raise RuntimeError(f"connection failed: {client._connection_error}")
+        if not await client.waitForData():
+            raise RuntimeError("no data after connecting")
+        total = time.perf_counter() - start
+    finally:
+        client.stopListening()
+    return {**client.getMetrics().phases, "total": total}
+
+
+async def _connected_client(host: str, port: int) -> GenvexNabto:
+    client = GenvexNabto("bench@example.com")
+    await client.startListening()
+    client.setManualIP(host, port)
+    client.connectToDevice()
+    await client.waitForConnection()
+    if client._connection_error or not await client.waitForData():
+        client.stopListening()
+        raise RuntimeError("could not connect to the simulator")
+    return client
+
+
+async def _full_poll(client: GenvexNabto) -> float:
+    """Make every datapoint list and the setpoints due, refresh once and wait for all replies."""
+    client._model_adapter.expediteDatapointUpdate()
+    client._last_setpointupdate = 0
+    start = time.perf_counter()
+    client.refresh()
+    while client._requests._pending:
+        await asyncio.sleep(0)
+    return time.perf_counter() - start
+
+
+async def _run(args) -> dict:
+    simulator = NilanSimulator(
+        fingerprint=FINGERPRINTS[args.model],
+        latency=args.latency,
+        jitter=args.jitter,
+        seed=args.seed,
+    )
+    host, port = await simulator.start()
+    results = {
+        "benchmark": "e2e",
+        "model": args.model,
+        "network": {"latency_s": args.latency, "jitter_s": args.jitter, "loss": args.loss},
+    }
+    try:
+        probes = [await _cold_probe(host, port) for _ in range(args.probes)]
+        results["cold_probe"] = {phase: _summary([probe[phase] for probe in probes]) for phase in probes[0]}
+
+        client = await _connected_client(host, port)
+        simulator.loss = args.loss  # U_CONNECT is not retransmitted, so only lose packets once connected
+        try:
+            await _full_poll(client)  # Warm up templates and decoders
+            gc.collect()
+            before = _resources()
+            received_before = sum(simulator.stats[kind] for kind in ("datapoint_readlist", "setpoint_readlist"))
+            sent_before = simulator.stats["sent"]
+            polls = [await _full_poll(client) for _ in range(args.polls)]
+            gc.collect()
+            after = _resources()
+            requests = sum(simulator.stats[kind] for kind in ("datapoint_readlist", "setpoint_readlist")) - received_before
+            results["poll"] = _summary(polls)
+            results["packets_per_poll"] = {
+                "requests": round(requests / args.polls, 2),
+                "replies": round((simulator.stats["sent"] - sent_before) / args.polls, 2),
+            }
+            results["poll_resource_growth"] = {"polls": args.polls, **_growth(before, after)}
+
+            writes = []
+            for index in range(args.writes):
+                start = time.perf_counter()
+                confirmed = await client.writeSetpoints({GenvexNabtoSetpointKey.FAN_SPEED: 1 + index % 3})
+                writes.append(time.perf_counter() - start)
+                if not confirmed:
+                    results.setdefault("write_failures", 0)
+                    results["write_failures"] += 1
+            results["setpoint_write"] = _summary(writes)
+        finally:
+            simulator.loss = 0.0
+            client.stopListening()
+
+        gc.collect()
+        before = _resources()
+        for _ in range(args.probes):
+            await _cold_probe(host, port)
+        gc.collect()
+        results["probe_resource_growth"] = {"probes": args.probes, **_growth(before, _resources())}
+    finally:
+        simulator.close()
+    results["decode"] = _decode_throughput(FINGERPRINTS[args.model], args.decodes)
+    return results
+
+
+def _decode_throughput(fingerprint, number: int) -> dict:
+    """Time decodeDatapoints on the largest default list, with every value changing on every decode.
+
+    The keys are passed in, as the adapter's scheduler moves keys whose values never change out of
+    their list, and parseDatapointResponce then rejects the response without decoding it.
+    """
+    adapter = GenvexNabtoModelAdapter(*fingerprint)
+    _, keys = max(adapter._currentDatapointList.items(), key=lambda item: len(item[1]))
+    decoder = adapter.getDatapointDecoder(keys)
+    payloads = [
+        len(keys).to_bytes(2, "big") + b"".join((position * 11 + shift).to_bytes(2, "big") for position in range(len(keys)))
+        for shift in (0, 50)
+    ]
+    calls = iter(range(number * 3))
+    elapsed = min(timeit.repeat(lambda: adapter.decodeDatapoints(keys, payloads[next(calls) % 2]), number=number, repeat=3))
+    last = payloads[(number * 3 - 1) % 2]
+    expected = decoder.decode(last, 2, len(keys))
+    decoded = [adapter.getValue(key) for key in keys]
+    if decoded != expected:
+        raise RuntimeError(f"decodeDatapoints did not decode the last payload: {decoded} != {expected}")
+    return {"keys": len(keys), "decodes_per_second": round(number / elapsed), "us_per_decode": round(elapsed / number * 1e6, 3)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", choices=sorted(FINGERPRINTS), default="cts602", help="Model the simulator reports")
+    parser.add_argument("--probes", type=int, default=10, help="Cold probes to time")
+    parser.add_argument("--polls", type=int, default=200, help="Full polls to time and check for resource growth")
+    parser.add_argument("--writes", type=int, default=20, help="Setpoint writes to time")
+    parser.add_argument("--decodes", type=int, default=20000, help="Decodes per throughput run")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated one-way reply latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Simulated latency jitter in seconds")
+    parser.add_argument("--loss", type=float, default=0.0, help="Simulated reply loss probability while polling and writing")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the simulated network")
+    parser.add_argument("--output", help="Also write the JSON to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(_run(args))
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Import cost of the vendored genvexnabto package and of the Home Assistant integration.
+
+Every sample runs in a fresh interpreter. Reports how long importing took, how long loading
+one model took afterwards, and which model modules ended up imported. The integration is only
+measured when homeassistant is installed.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+# Runs in the child interpreter; prints one JSON object
+_PROBE = """
+import asyncio, json, logging, struct, sys, time  # Already loaded in any host process, keep them out of the numbers
+sys.path.insert(0, {path!r})
+start = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+models = {models!r}
+from {models} import loadModel
+loadModel(1140, 0, 2763306, 3)
+loaded = time.perf_counter()
+print(json.dumps({{
+    "import_s": imported - start,
+    "load_model_s": loaded - imported,
+    "model_modules": sorted(name.rsplit(".", 1)[1] for name in sys.modules
+                            if name.startswith(models + ".") and name.rsplit(".", 1)[1] not in ("basemodel", "registry")),
+}}))
+"""
+
+TARGETS = {
+    "genvexnabto": (str(REPO_ROOT / "vendor"), "genvexnabto", "genvexnabto.models"),
+    "integration": (str(REPO_ROOT), "custom_components.nilan_nabto.sensor", "custom_components.nilan_nabto.vendor.genvexnabto.models"),
+}
+
+
+def _sample(path: str, module: str, models: str):
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(path=path, module=module, models=models)],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if result.returncode != 0:
+        return None, result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed"
+    return json.loads(result.stdout), None
+
+
+def _measure(name: str, number: int) -> dict:
+    samples = []
+    for _ in range(number):
+        sample, error = _sample(*TARGETS[name])
+        if sample is None:
+            return {"skipped": error}
+        samples.append(sample)
+    return {
+        "import_ms_min": round(min(s["import_s"] for s in samples) * 1000, 2),
+        "import_ms_median": round(statistics.median(s["import_s"] for s in samples) * 1000, 2),
+        "load_model_ms_median": round(statistics.median(s["load_model_s"] for s in samples) * 1000, 2),
+        "model_modules_imported": samples[-1]["model_modules"],
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=10, help="Fresh interpreters per target")
+    args = parser.parse_args()
+
+    print(json.dumps({"benchmark": "import", **{name: _measure(name, args.number) for name in TARGETS}}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Measure how many DATA packets per second the generic packet path, the session packet builder and a memoized list packet produce."""
+import argparse
+import json
+import sys
+import timeit
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "vendor"))
+
+from genvexnabto.genvexnabto_modeladapter import GenvexNabtoModelAdapter  # noqa: E402
+from genvexnabto.protocol import (  # noqa: E402
+    GenvexCommandDatapointReadList,
+    GenvexPacket,
+    GenvexPacketBuilder,
+    GenvexPacketTemplate,
+    GenvexPacketType,
+    GenvexPayloadCrypt,
+)
+
+CLIENT_ID = b"\x01\x02\x03\x04"
+SERVER_ID = b"\x05\x06\x07\x08"
+
+
+def _generic_packet(datapoints, sequence_id: int) -> bytes:
+    # What every poll cost before: encode the list, wrap it and build the packet from scratch
+    payload = GenvexPayloadCrypt()
+    payload.setData(GenvexCommandDatapointReadList.buildCommand(datapoints))
+    return GenvexPacket.build_packet(CLIENT_ID, SERVER_ID, GenvexPacketType.DATA, sequence_id, [payload])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=20000, help="Packets per timing run")
+    args = parser.parse_args()
+
+    adapter = GenvexNabtoModelAdapter(1140, 0, 2763306, 3)  # Nilan CTS602
+    datapoints = adapter.getDatapointsForKeys(adapter._loadedModel.getDefaultDatapointRequest())
+    builder = GenvexPacketBuilder(CLIENT_ID, SERVER_ID)
+    command = GenvexCommandDatapointReadList.buildCommand(datapoints)  # Cached per request list by the client
+    template = GenvexPacketTemplate(builder.buildDataPacket(0, command))  # Memoized per request list by the client
+    assert builder.buildDataPacket(7, command) == _generic_packet(datapoints, 7) == template.render(7)
+
+    generic = min(timeit.repeat(lambda: _generic_packet(datapoints, 7), number=args.number, repeat=5))
+    built = min(timeit.repeat(lambda: builder.buildDataPacket(7, command), number=args.number, repeat=5))
+    rendered = min(timeit.repeat(lambda: template.render(7), number=args.number, repeat=5))
+    print(json.dumps({
+        "benchmark": "build_datapoint_packet",
+        "datapoints": len(datapoints),
+        "packet_bytes": len(command) + GenvexPacketBuilder.OVERHEAD,
+        "generic_packets_per_second": round(args.number / generic),
+        "builder_packets_per_second": round(args.number / built),
+        "template_packets_per_second": round(args.number / rendered),
+        "speedup": round(generic / built, 2),
+        "template_speedup": round(generic / rendered, 2),
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Replay throughput of a packet capture, emitted as one JSON document.
+
+Replays a capture made with `nilan_comm.py nabto --capture` through fresh clients as fast
+as possible, so the receive and decode path can be profiled without hardware. Without
+--capture, a session against the local simulator is recorded first.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "vendor"))
+sys.path.insert(0, str(REPO_ROOT))
+
+from genvexnabto import GenvexNabto, GenvexNabtoCapture, GenvexNabtoReplay  # noqa: E402
+from nilan_simulator import FINGERPRINTS, NilanSimulator  # noqa: E402
+
+
+async def _record(path: str, model: str, polls: int) -> None:
+    """Capture a connect plus polls full polls against the simulator."""
+    simulator = NilanSimulator(fingerprint=FINGERPRINTS[model])
+    host, port = await simulator.start()
+    client = GenvexNabto("bench@example.com")
+    capture = GenvexNabtoCapture(path)
+    client.setCapture(capture)
+    try:
+        await client.startListening()
+        client.setManualIP(host, port)
+        client.connectToDevice()
+        await client.waitForConnection()
+        if client._connection_error or not await client.waitForData():
+            raise RuntimeError("could not connect to the simulator")
+        for _ in range(polls):
+            client._model_adapter.expediteDatapointUpdate()
+            client._last_setpointupdate = 0
+            client.refresh()
+            while client._requests._pending:
+                await asyncio.sleep(0)
+    finally:
+        client.stopListening()
+        capture.close()
+        simulator.close()
+
+
+async def _replay(replay: GenvexNabtoReplay, repeat: int) -> dict:
+    durations = []
+    received = 0
+    for _ in range(repeat):
+        client = GenvexNabto()
+        start = time.perf_counter()
+        received = await replay.run(client)
+        durations.append(time.perf_counter() - start)
+        if client._model_adapter is None:
+            raise RuntimeError("the capture holds no model ping")
+    best = min(durations)
+    return {
+        "received_per_replay": received,
+        "replay_ms_min": round(best * 1000, 3),
+        "replay_ms_median": round(statistics.median(durations) * 1000, 3),
+        "received_packets_per_second": round(received / best) if best else None,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--capture", help="Capture to replay; records one against the simulator when left out")
+    parser.add_argument("--model", choices=sorted(FINGERPRINTS), default="cts602", help="Simulated model when recording")
+    parser.add_argument("--polls", type=int, default=200, help="Full polls to record")
+    parser.add_argument("--repeat", type=int, default=20, help="Replays to time")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = args.capture
+        if path is None:
+            path = str(Path(directory) / "session.cap")
+            asyncio.run(_record(path, args.model, args.polls))
+        replay = GenvexNabtoReplay.load(path)
+        results = {
+            "benchmark": "replay",
+            "capture": args.capture or f"simulator {args.model}, {args.polls} polls",
+            "packets": len(replay.records),
+            "bytes": Path(path).stat().st_size,
+            **asyncio.run(_replay(replay, args.repeat)),
+        }
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
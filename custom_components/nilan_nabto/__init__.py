@@ -4,18 +4,38 @@ from typing import Any
 
 import voluptuous as vol
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant, ServiceCall
+from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse
 from homeassistant.exceptions import HomeAssistantError
 from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.storage import Store
 
-from .const import CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL, DOMAIN, PLATFORMS
+from .const import (
+    CONF_MODEL_INFO,
+    CONF_SCAN_INTERVAL,
+    DATA_DISCOVERY_CACHE,
+    DEFAULT_SCAN_INTERVAL,
+    DISCOVERY_SAVE_DELAY,
+    DISCOVERY_STORE_KEY,
+    DISCOVERY_STORE_VERSION,
+    DOMAIN,
+    PLATFORMS,
+    SNAPSHOT_STORE_KEY,
+    SNAPSHOT_STORE_VERSION,
+)
 from .coordinator import NilanNabtoCoordinator
+from .vendor.genvexnabto import GenvexNabtoDiscoveryCache
 
 CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
 SERVICE_SET_SETPOINT = "set_setpoint"
+SERVICE_SET_SETPOINTS = "set_setpoints"
+SERVICE_GET_HISTORY = "get_history"
 ATTR_KEY = "key"
 ATTR_VALUE = "value"
+ATTR_SETPOINTS = "setpoints"
 ATTR_ENTRY_ID = "entry_id"
+ATTR_KEYS = "keys"
+ATTR_WINDOW = "window"
+ATTR_SAMPLES = "samples"
 
 SERVICE_SET_SETPOINT_SCHEMA = vol.Schema(
     {
@@ -25,6 +45,22 @@ SERVICE_SET_SETPOINT_SCHEMA = vol.Schema(
     }
 )
 
+SERVICE_SET_SETPOINTS_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_SETPOINTS): vol.All({cv.string: vol.Coerce(float)}, vol.Length(min=1)),
+        vol.Optional(ATTR_ENTRY_ID): cv.string,
+    }
+)
+
+SERVICE_GET_HISTORY_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_KEYS): vol.All(cv.ensure_list, [cv.string]),
+        vol.Optional(ATTR_WINDOW): vol.All(vol.Coerce(float), vol.Range(min=1)),
+        vol.Optional(ATTR_SAMPLES, default=0): vol.All(vol.Coerce(int), vol.Range(min=0, max=1000)),
+        vol.Optional(ATTR_ENTRY_ID): cv.string,
+    }
+)
+
 
 def _resolve_coordinator(
     hass: HomeAssistant, entry_id: str | None, fallback_entry_id: str
@@ -39,13 +75,42 @@ def _resolve_coordinator(
     return coordinator
 
 
+async def _async_get_discovery_cache(hass: HomeAssistant) -> GenvexNabtoDiscoveryCache:
+    """Return the device address cache shared by all entries, loading it from storage once."""
+    if DATA_DISCOVERY_CACHE in hass.data:
+        return hass.data[DATA_DISCOVERY_CACHE]
+    store: Store[dict[str, Any]] = Store(hass, DISCOVERY_STORE_VERSION, DISCOVERY_STORE_KEY)
+    cache = GenvexNabtoDiscoveryCache()
+    cache.fromDict(await store.async_load())
+    # Another entry may have loaded it while we awaited storage.
+    cache = hass.data.setdefault(DATA_DISCOVERY_CACHE, cache)
+    cache.setChangeCallback(lambda: store.async_delay_save(cache.toDict, DISCOVERY_SAVE_DELAY))
+    return cache
+
+
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     coordinator = NilanNabtoCoordinator(
         hass,
-        dict(entry.data),
+        {**entry.data, **entry.options},
         int(entry.options.get(CONF_SCAN_INTERVAL, entry.data.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL))),
+        discovery_cache=await _async_get_discovery_cache(hass),
+        entry_id=entry.entry_id,
     )
-    await coordinator.async_config_entry_first_refresh()
+    try:
+        # With a snapshot from the last run, entities start with those values (marked stale) and
+        # the session connects in the background; setup no longer waits on, or fails with, the device.
+        warm_start = await coordinator.async_restore_snapshot()
+        await coordinator.async_preload_model()
+        if not warm_start:
+            await coordinator.async_config_entry_first_refresh()
+    except Exception:
+        await coordinator.async_shutdown()
+        raise
+
+    # Cache the model fingerprint so entity creation does not depend on a live probe next time.
+    model_info = coordinator.model_info
+    if model_info and entry.data.get(CONF_MODEL_INFO) != model_info:
+        hass.config_entries.async_update_entry(entry, data={**entry.data, CONF_MODEL_INFO: model_info})
 
     hass.data.setdefault(DOMAIN, {})[entry.entry_id] = coordinator
 
@@ -59,7 +124,6 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
             key = call.data[ATTR_KEY]
             value = float(call.data[ATTR_VALUE])
             await coordinator_for_call.async_set_setpoint(key, value)
-            await coordinator_for_call.async_request_refresh()
 
         hass.services.async_register(
             DOMAIN,
@@ -68,14 +132,65 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
             schema=SERVICE_SET_SETPOINT_SCHEMA,
         )
 
+    if not hass.services.has_service(DOMAIN, SERVICE_SET_SETPOINTS):
+        async def _async_handle_set_setpoints(call: ServiceCall) -> None:
+            coordinator_for_call = _resolve_coordinator(
+                hass,
+                call.data.get(ATTR_ENTRY_ID),
+                entry.entry_id,
+            )
+            await coordinator_for_call.async_set_setpoints(dict(call.data[ATTR_SETPOINTS]))
+
+        hass.services.async_register(
+            DOMAIN,
+            SERVICE_SET_SETPOINTS,
+            _async_handle_set_setpoints,
+            schema=SERVICE_SET_SETPOINTS_SCHEMA,
+        )
+
+    if not hass.services.has_service(DOMAIN, SERVICE_GET_HISTORY):
+        async def _async_handle_get_history(call: ServiceCall) -> ServiceResponse:
+            coordinator_for_call = _resolve_coordinator(
+                hass,
+                call.data.get(ATTR_ENTRY_ID),
+                entry.entry_id,
+            )
+            return coordinator_for_call.history_report(
+                call.data.get(ATTR_KEYS),
+                call.data.get(ATTR_WINDOW),
+                call.data[ATTR_SAMPLES],
+            )
+
+        hass.services.async_register(
+            DOMAIN,
+            SERVICE_GET_HISTORY,
+            _async_handle_get_history,
+            schema=SERVICE_GET_HISTORY_SCHEMA,
+            supports_response=SupportsResponse.ONLY,
+        )
+
+    entry.async_on_unload(entry.add_update_listener(_async_update_listener))
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    if warm_start:
+        entry.async_create_background_task(hass, coordinator.async_refresh(), f"{DOMAIN} connect {entry.entry_id}")
     return True
 
 
+async def _async_update_listener(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    await hass.config_entries.async_reload(entry.entry_id)
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id)
-        if not hass.data[DOMAIN] and hass.services.has_service(DOMAIN, SERVICE_SET_SETPOINT):
-            hass.services.async_remove(DOMAIN, SERVICE_SET_SETPOINT)
+        coordinator: NilanNabtoCoordinator = hass.data[DOMAIN].pop(entry.entry_id)
+        await coordinator.async_shutdown()
+        if not hass.data[DOMAIN]:
+            for service in (SERVICE_SET_SETPOINT, SERVICE_SET_SETPOINTS, SERVICE_GET_HISTORY):
+                if hass.services.has_service(DOMAIN, service):
+                    hass.services.async_remove(DOMAIN, service)
     return unload_ok
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    await Store(hass, SNAPSHOT_STORE_VERSION, f"{SNAPSHOT_STORE_KEY}.{entry.entry_id}").async_remove()
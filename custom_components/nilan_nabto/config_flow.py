@@ -10,8 +10,18 @@ from .const import (
     CONF_DEVICE_ID,
     CONF_EMAIL,
     CONF_HOST,
+    CONF_DEADBAND_HEARTBEAT,
+    CONF_DEADBAND_TEMPERATURE,
+    CONF_POLL_FAST,
+    CONF_POLL_MEDIUM,
+    CONF_POLL_SLOW,
     CONF_PORT,
     CONF_SCAN_INTERVAL,
+    DEFAULT_DEADBAND_HEARTBEAT,
+    DEFAULT_DEADBAND_TEMPERATURE,
+    DEFAULT_POLL_FAST,
+    DEFAULT_POLL_MEDIUM,
+    DEFAULT_POLL_SLOW,
     DEFAULT_PORT,
     DEFAULT_SCAN_INTERVAL,
     DOMAIN,
@@ -58,5 +68,27 @@ class NilanNabtoOptionsFlowHandler(config_entries.OptionsFlow):
             self.config_entry.data.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL),
         )
 
-        schema = vol.Schema({vol.Optional(CONF_SCAN_INTERVAL, default=current_scan): int})
+        options = self.config_entry.options
+        schema = vol.Schema(
+            {
+                vol.Optional(CONF_SCAN_INTERVAL, default=current_scan): int,
+                vol.Optional(CONF_POLL_FAST, default=options.get(CONF_POLL_FAST, DEFAULT_POLL_FAST)): vol.All(
+                    int, vol.Range(min=1)
+                ),
+                vol.Optional(CONF_POLL_MEDIUM, default=options.get(CONF_POLL_MEDIUM, DEFAULT_POLL_MEDIUM)): vol.All(
+                    int, vol.Range(min=1)
+                ),
+                vol.Optional(CONF_POLL_SLOW, default=options.get(CONF_POLL_SLOW, DEFAULT_POLL_SLOW)): vol.All(
+                    int, vol.Range(min=1)
+                ),
+                vol.Optional(
+                    CONF_DEADBAND_TEMPERATURE,
+                    default=options.get(CONF_DEADBAND_TEMPERATURE, DEFAULT_DEADBAND_TEMPERATURE),
+                ): vol.All(vol.Coerce(float), vol.Range(min=0, max=5)),
+                vol.Optional(
+                    CONF_DEADBAND_HEARTBEAT,
+                    default=options.get(CONF_DEADBAND_HEARTBEAT, DEFAULT_DEADBAND_HEARTBEAT),
+                ): vol.All(int, vol.Range(min=0)),
+            }
+        )
         return self.async_show_form(step_id="init", data_schema=schema)
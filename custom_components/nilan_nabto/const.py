@@ -1,11 +1,35 @@
 DOMAIN = "nilan_nabto"
 PLATFORMS = ["sensor", "number"]
+# hass.data key of the GenvexNabtoHub whose socket all config entries share
+DATA_HUB = f"{DOMAIN}_hub"
+# hass.data key of the GenvexNabtoDiscoveryCache shared by all config entries, persisted in .storage
+DATA_DISCOVERY_CACHE = f"{DOMAIN}_discovery"
+DISCOVERY_STORE_KEY = f"{DOMAIN}.discovery"
+DISCOVERY_STORE_VERSION = 1
+DISCOVERY_SAVE_DELAY = 10
+# Per-entry store of the last good report, seeding entities at startup while the session connects
+SNAPSHOT_STORE_KEY = f"{DOMAIN}.snapshot"
+SNAPSHOT_STORE_VERSION = 1
+SNAPSHOT_SAVE_DELAY = 30
 
 CONF_EMAIL = "email"
 CONF_HOST = "host"
 CONF_PORT = "port"
 CONF_DEVICE_ID = "device_id"
 CONF_SCAN_INTERVAL = "scan_interval"
+CONF_MODEL_INFO = "model_info"
+CONF_POLL_FAST = "poll_interval_fast"
+CONF_POLL_MEDIUM = "poll_interval_medium"
+CONF_POLL_SLOW = "poll_interval_slow"
+CONF_DEADBAND_TEMPERATURE = "deadband_temperature"
+CONF_DEADBAND_HEARTBEAT = "deadband_heartbeat"
 
 DEFAULT_PORT = 5570
 DEFAULT_SCAN_INTERVAL = 30
+# Device poll intervals (seconds) for fans/RPM/CO2, temperatures, and filter/alarm/state datapoints.
+DEFAULT_POLL_FAST = 10
+DEFAULT_POLL_MEDIUM = 30
+DEFAULT_POLL_SLOW = 180
+# Smallest temperature change (°C) pushed to entities, and seconds after which a smaller change is pushed anyway.
+DEFAULT_DEADBAND_TEMPERATURE = 0.2
+DEFAULT_DEADBAND_HEARTBEAT = 600
@@ -1,52 +1,248 @@
 from __future__ import annotations
 
 import logging
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Any
 
-from homeassistant.core import HomeAssistant
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
 from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 
-from .const import CONF_DEVICE_ID, CONF_EMAIL, CONF_HOST, CONF_PORT, DOMAIN
-from .nabto_client import run_nabto_probe, run_nabto_setpoint
+from .const import (
+    CONF_DEADBAND_HEARTBEAT,
+    CONF_DEADBAND_TEMPERATURE,
+    CONF_DEVICE_ID,
+    CONF_EMAIL,
+    CONF_HOST,
+    CONF_MODEL_INFO,
+    CONF_POLL_FAST,
+    CONF_POLL_MEDIUM,
+    CONF_POLL_SLOW,
+    CONF_PORT,
+    DATA_HUB,
+    DEFAULT_DEADBAND_HEARTBEAT,
+    DEFAULT_DEADBAND_TEMPERATURE,
+    DEFAULT_POLL_FAST,
+    DEFAULT_POLL_MEDIUM,
+    DEFAULT_POLL_SLOW,
+    DOMAIN,
+    SNAPSHOT_SAVE_DELAY,
+    SNAPSHOT_STORE_KEY,
+    SNAPSHOT_STORE_VERSION,
+)
+from .nabto_client import NilanNabtoSession
+from .vendor.genvexnabto import (
+    GenvexNabtoDiscoveryCache,
+    GenvexNabtoHistory,
+    GenvexNabtoHub,
+    GenvexNabtoKeyClass,
+    GenvexNabtoMetrics,
+)
+from .vendor.genvexnabto.models import importModelClasses, loadModel
 
 _LOGGER = logging.getLogger(__name__)
 
 
 class NilanNabtoCoordinator(DataUpdateCoordinator[dict[str, Any]]):
-    def __init__(self, hass: HomeAssistant, config: dict[str, Any], interval_seconds: int) -> None:
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        config: dict[str, Any],
+        interval_seconds: int,
+        discovery_cache: GenvexNabtoDiscoveryCache | None = None,
+        entry_id: str | None = None,
+    ) -> None:
         self._config = config
+        # Last good report, so a restart can show values before the device answers
+        self._snapshot_store: Store[dict[str, Any]] | None = (
+            Store(hass, SNAPSHOT_STORE_VERSION, f"{SNAPSHOT_STORE_KEY}.{entry_id}") if entry_id else None
+        )
+        self._cached_model_info: dict[str, Any] | None = config.get(CONF_MODEL_INFO)
+        self._session = NilanNabtoSession(
+            email=config[CONF_EMAIL],
+            device_id=config.get(CONF_DEVICE_ID),
+            host=config.get(CONF_HOST),
+            port=int(config.get(CONF_PORT)),
+            poll_intervals={
+                "fast": int(config.get(CONF_POLL_FAST, DEFAULT_POLL_FAST)),
+                "medium": int(config.get(CONF_POLL_MEDIUM, DEFAULT_POLL_MEDIUM)),
+                "slow": int(config.get(CONF_POLL_SLOW, DEFAULT_POLL_SLOW)),
+            },
+            deadbands={
+                "deadbands": {
+                    GenvexNabtoKeyClass.TEMPERATURE: (
+                        float(config.get(CONF_DEADBAND_TEMPERATURE, DEFAULT_DEADBAND_TEMPERATURE)),
+                        0,
+                    ),
+                },
+                "heartbeat": int(config.get(CONF_DEADBAND_HEARTBEAT, DEFAULT_DEADBAND_HEARTBEAT)),
+            },
+            hub=hass.data.setdefault(DATA_HUB, GenvexNabtoHub()),
+            discovery_cache=discovery_cache,
+        )
         super().__init__(
             hass,
             _LOGGER,
             name=DOMAIN,
             update_interval=timedelta(seconds=interval_seconds),
         )
+        self._key_listeners: dict[str, list[CALLBACK_TYPE]] = {}
+        self._changed_values: dict[tuple[str, str], Any] = {}
+        self._session.set_update_callback(self._handle_value_update)
+
+    @property
+    def model_info(self) -> dict[str, Any] | None:
+        """Model name and provided keys, from the live session or the copy cached in the config entry."""
+        return (self.data or {}).get("model") or self._cached_model_info
+
+    @property
+    def metrics(self) -> GenvexNabtoMetrics:
+        """Packet, retransmission and latency counters of the session, kept across reconnects."""
+        return self._session.metrics
+
+    @property
+    def history(self) -> GenvexNabtoHistory:
+        """In-memory history of every polled datapoint, kept across reconnects."""
+        return self._session.history
+
+    @property
+    def selected_device(self) -> dict[str, Any] | None:
+        return self._session.selected_device
+
+    def provided_keys(self, source: str) -> list[str] | None:
+        """Keys of the given source ("datapoints" or "setpoints") the device provides, if known."""
+        model_info = self.model_info
+        if not model_info:
+            return None
+        return list(model_info.get(source, []))
+
+    @callback
+    def async_add_key_listener(self, key: str, update_callback: CALLBACK_TYPE) -> CALLBACK_TYPE:
+        """Listen for pushed changes of a single datapoint or setpoint key."""
+        listeners = self._key_listeners.setdefault(key, [])
+        listeners.append(update_callback)
+
+        @callback
+        def remove_listener() -> None:
+            listeners.remove(update_callback)
+
+        return remove_listener
+
+    @callback
+    def _handle_value_update(self, source: str, key: str, value: Any) -> None:
+        # Called while a response packet is being decoded; collect changes and flush once it is done.
+        if not self._changed_values:
+            self.hass.loop.call_soon(self._async_flush_value_updates)
+        self._changed_values[(source, key)] = value
+
+    @callback
+    def _async_flush_value_updates(self) -> None:
+        changed, self._changed_values = self._changed_values, {}
+        data = self.data
+        if data is None:
+            return
+        for (source, key), value in changed.items():
+            # Keys missing from the last snapshot are added; setpoints get their min/max/step with the next poll.
+            if source == "datapoints":
+                data["datapoints"][key] = value
+            else:
+                data["setpoints"].setdefault(key, {})["value"] = value
+            for update_callback in list(self._key_listeners.get(key, ())):
+                update_callback()
+
+    @property
+    def is_stale(self) -> bool:
+        """True while the data is the snapshot restored at startup, not yet confirmed by the device."""
+        return bool((self.data or {}).get("stale"))
+
+    async def async_restore_snapshot(self) -> bool:
+        """Seed the data with the last good report, marked stale. Returns False if there is none."""
+        if self._snapshot_store is None:
+            return False
+        snapshot = await self._snapshot_store.async_load()
+        if not snapshot or not snapshot.get("ok"):
+            return False
+        self.async_set_updated_data({**snapshot, "stale": True})
+        return True
+
+    def _snapshot_to_save(self) -> dict[str, Any]:
+        # Evaluated when the delayed save runs, so values pushed since the last poll are included
+        return {key: value for key, value in (self.data or {}).items() if key != "stale"}
+
+    @callback
+    def _async_schedule_snapshot_save(self) -> None:
+        # Only called with a good report from the device, which becomes the data before the delayed save runs
+        if self._snapshot_store is not None:
+            self._snapshot_store.async_delay_save(self._snapshot_to_save, SNAPSHOT_SAVE_DELAY)
+
+    def history_report(self, keys: list[str] | None, window: float | None, samples: int = 0) -> dict[str, Any]:
+        """Windowed min/max/mean/last of the given datapoints (all recorded ones by default), with the newest samples."""
+        history = self.history
+        datapoints: dict[str, Any] = {}
+        for key in keys or history.getKeys():
+            stats = history.getStats(key, window)
+            if stats is None:
+                continue
+            if samples:
+                stats["samples"] = [
+                    [datetime.fromtimestamp(timestamp, timezone.utc).isoformat(), value]
+                    for timestamp, value in history.getLast(key, samples, window)
+                ]
+            datapoints[key] = stats
+        return {"window": window, "datapoints": datapoints}
+
+    async def async_preload_model(self) -> None:
+        """Import and build the model the device was last seen as in the executor.
+
+        Model modules are imported on first use; doing it here keeps that file I/O off the event
+        loop when the session connects. For a device never seen before every model module is
+        imported, as its model is only known once the device answers a ping on the loop.
+        """
+        fingerprint = self._session.cached_fingerprint()
+        if fingerprint is None and (self.data or {}).get("fingerprint"):
+            fingerprint = tuple(self.data["fingerprint"])
+        if fingerprint is not None:
+            await self.hass.async_add_executor_job(loadModel, *fingerprint)
+        else:
+            await self.hass.async_add_executor_job(importModelClasses)
 
     async def _async_update_data(self) -> dict[str, Any]:
-        report = await run_nabto_probe(
-            email=self._config[CONF_EMAIL],
-            device_id=self._config.get(CONF_DEVICE_ID),
-            host=self._config.get(CONF_HOST),
-            port=int(self._config.get(CONF_PORT)),
-        )
+        report = await self._session.async_snapshot()
         if not report.get("ok"):
             raise UpdateFailed(
                 f"Nilan Nabto update failed: {report.get('connection_error') or report.get('error') or 'unknown_error'}"
             )
+        self._async_schedule_snapshot_save()
         return report
 
+    async def _async_publish_written(self) -> None:
+        # The confirmed values are already cached in the session, so publish them without a new poll.
+        # The snapshot reconnects a stale session; if that fails, leave it to a regular refresh.
+        report = await self._session.async_snapshot()
+        if not report.get("ok"):
+            await self.async_request_refresh()
+            return
+        self.async_set_updated_data(report)
+        self._async_schedule_snapshot_save()
+
     async def async_set_setpoint(self, key: str, value: float) -> None:
-        report = await run_nabto_setpoint(
-            email=self._config[CONF_EMAIL],
-            device_id=self._config.get(CONF_DEVICE_ID),
-            host=self._config.get(CONF_HOST),
-            port=int(self._config.get(CONF_PORT)),
-            key=key,
-            value=value,
-        )
+        report = await self._session.async_set_setpoint(key, value)
         if not report.get("ok"):
             raise HomeAssistantError(
                 f"Setpoint write failed for {key}: {report.get('connection_error') or 'unknown_error'}"
             )
+        await self._async_publish_written()
+
+    async def async_set_setpoints(self, values: dict[str, float]) -> None:
+        report = await self._session.async_set_setpoints(values)
+        if not report.get("ok"):
+            failed = report.get("failed_key")
+            raise HomeAssistantError(
+                f"Setpoint write failed{f' for {failed}' if failed else ''}: {report.get('connection_error') or 'unknown_error'}"
+            )
+        await self._async_publish_written()
+
+    async def async_shutdown(self) -> None:
+        await super().async_shutdown()
+        self._session.close()
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import CONF_EMAIL, DOMAIN
+from .coordinator import NilanNabtoCoordinator
+
+TO_REDACT = {CONF_EMAIL}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict[str, Any]:
+    """Config, connection state and the session's packet and latency metrics, without the authorized email."""
+    coordinator: NilanNabtoCoordinator = hass.data[DOMAIN][entry.entry_id]
+    data = coordinator.data or {}
+    return {
+        "entry": {
+            "data": async_redact_data(dict(entry.data), TO_REDACT),
+            "options": async_redact_data(dict(entry.options), TO_REDACT),
+        },
+        "session": {
+            "selected_device": coordinator.selected_device,
+            "last_update_success": coordinator.last_update_success,
+            "stale": coordinator.is_stale,
+            "timestamp_utc": data.get("timestamp_utc"),
+            "connection_error": data.get("connection_error"),
+            "model": coordinator.model_info,
+        },
+        "metrics": coordinator.metrics.asDict(),
+        "history": coordinator.history.asDict(),
+    }
@@ -1,12 +1,23 @@
 from __future__ import annotations
 
 import asyncio
+import logging
+import time
+from collections.abc import Callable
 from datetime import datetime, timezone
+from functools import partial
 from typing import Any
 
-from .vendor.genvexnabto import GenvexNabto
+from .vendor.genvexnabto import GenvexNabto, GenvexNabtoDiscoveryCache, GenvexNabtoHistory, GenvexNabtoHub, GenvexNabtoMetrics
+from .vendor.genvexnabto.const import SECONDS_UNTILRECONNECT
 from .vendor.genvexnabto.models import GenvexNabtoDatapointKey, GenvexNabtoSetpointKey
 
+_LOGGER = logging.getLogger(__name__)
+
+# A session that has not heard from the device for this long is torn down and rebuilt.
+# The client itself retries U_CONNECT after SECONDS_UNTILRECONNECT, so give it a few tries first.
+SESSION_STALE_SECONDS = SECONDS_UNTILRECONNECT * 3
+
 
 def _all_class_values(cls) -> list[str]:
     values: list[str] = []
@@ -22,8 +33,132 @@ def _utc_now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-async def run_nabto_probe(email: str, device_id: str | None, host: str | None, port: int) -> dict[str, Any]:
-    n = GenvexNabto(email)
+def _utc_iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+async def _async_open(
+    n: GenvexNabto,
+    report: dict[str, Any],
+    device_id: str | None,
+    host: str | None,
+    port: int,
+) -> bool:
+    """Find, connect and wait for the first data on a fresh client, recording progress in report.
+
+    Only broadcasts for every device when neither host nor device_id is given. A device_id
+    resolves from the client's discovery cache, or else from a broadcast for that device only.
+    """
+    await n.startListening()
+    if host:
+        n.setManualIP(host, port)
+        report["selected_device"] = {"mode": "manual_ip", "host": host, "port": port}
+    elif device_id:
+        n.setDevice(device_id)
+        found = await n.waitForDiscovery()
+        report["selected_device"] = {"mode": "device_id", "device_id": device_id, "found": found}
+        if not found:
+            report["connection_error"] = "device_not_discovered"
+            return False
+    elif discovered := await n.discoverDevices(clear=True):
+        first = next(iter(discovered.items()))
+        n.setDevice(first[0])
+        report["selected_device"] = {
+            "mode": "first_discovered",
+            "device_id": first[0],
+            "host": first[1][0],
+            "port": first[1][1],
+        }
+    else:
+        report["connection_error"] = "no_devices_discovered"
+        return False
+
+    if "discovered_devices" in report:
+        report["discovered_devices"] = {k: [v[0], v[1]] for k, v in n._discovered_devices.items()}  # noqa: SLF001
+
+    n.connectToDevice()
+    await n.waitForConnection()
+    if n._connection_error:  # noqa: SLF001
+        report["connection_error"] = n._connection_error  # noqa: SLF001
+        return False
+
+    got_data = await n.waitForData()
+    if not got_data:
+        report["connection_error"] = "connected_but_no_data"
+        return False
+    return True
+
+
+def _model_info(n: GenvexNabto) -> dict[str, Any]:
+    """Describe the connected model: its name and the keys it actually provides."""
+    adapter = n._model_adapter  # noqa: SLF001
+    return {
+        "model_name": adapter.getModelName(),
+        "manufacturer": adapter.getManufacturer(),
+        "datapoints": sorted(key for key in _all_class_values(GenvexNabtoDatapointKey) if n.providesValue(key)),
+        "setpoints": sorted(key for key in _all_class_values(GenvexNabtoSetpointKey) if n.providesValue(key)),
+    }
+
+
+def _collect_values(n: GenvexNabto, report: dict[str, Any]) -> None:
+    # Datapoints as last pushed to update handlers, so a poll does not undo the deadband
+    for key in _all_class_values(GenvexNabtoDatapointKey):
+        if n.providesValue(key) and n.hasValue(key):
+            report["datapoints"][key] = n.getPublishedValue(key)
+
+    for key in _all_class_values(GenvexNabtoSetpointKey):
+        if n.providesValue(key) and n.hasValue(key):
+            report["setpoints"][key] = {
+                "value": n.getValue(key),
+                "min": n.getSetpointMinValue(key),
+                "max": n.getSetpointMaxValue(key),
+                "step": n.getSetpointStep(key),
+            }
+
+
+async def _async_write_setpoints(n: GenvexNabto, report: dict[str, Any], values: dict[str, float]) -> dict[str, Any]:
+    """Validate and write setpoints in one packet on a connected client, waiting for the device to confirm them."""
+    for key, value in values.items():
+        if not n.providesSetpoint(key):
+            report["connection_error"] = "setpoint_not_supported"
+            report["failed_key"] = key
+            return report
+
+        min_value = n.getSetpointMinValue(key)
+        max_value = n.getSetpointMaxValue(key)
+        if value < min_value or value > max_value:
+            report["connection_error"] = "setpoint_out_of_range"
+            report["failed_key"] = key
+            report["min"] = min_value
+            report["max"] = max_value
+            return report
+
+    try:
+        confirmed = await n.writeSetpoints(values)
+    except asyncio.TimeoutError:
+        report["connection_error"] = "setpoint_write_timeout"
+        return report
+    report["readback"] = {key: n.getValue(key) if n.hasValue(key) else None for key in values}
+    report["ok"] = confirmed
+    if not confirmed:
+        report["connection_error"] = "setpoint_readback_mismatch"
+    return report
+
+
+async def _async_write_setpoint(n: GenvexNabto, report: dict[str, Any], key: str, value: float) -> dict[str, Any]:
+    await _async_write_setpoints(n, report, {key: value})
+    report["readback_value"] = report.get("readback", {}).get(key)
+    return report
+
+
+async def run_nabto_probe(
+    email: str,
+    device_id: str | None,
+    host: str | None,
+    port: int,
+    discovery_cache: GenvexNabtoDiscoveryCache | None = None,
+) -> dict[str, Any]:
+    n = GenvexNabto(email, discoveryCache=discovery_cache)
     report: dict[str, Any] = {
         "mode": "nabto-probe",
         "timestamp_utc": _utc_now_iso(),
@@ -36,56 +171,9 @@ async def run_nabto_probe(email: str, device_id: str | None, host: str | None, p
     }
 
     try:
-        discovered = await n.discoverDevices(clear=True)
-        report["discovered_devices"] = {k: [v[0], v[1]] for k, v in discovered.items()}
-
-        if host:
-            n.setManualIP(host, port)
-            report["selected_device"] = {"mode": "manual_ip", "host": host, "port": port}
-        elif device_id:
-            n.setDevice(device_id)
-            found = await n.waitForDiscovery()
-            report["selected_device"] = {"mode": "device_id", "device_id": device_id, "found": found}
-            if not found:
-                report["connection_error"] = "device_not_discovered"
-                return report
-        elif discovered:
-            first = next(iter(discovered.items()))
-            n.setDevice(first[0])
-            report["selected_device"] = {
-                "mode": "first_discovered",
-                "device_id": first[0],
-                "host": first[1][0],
-                "port": first[1][1],
-            }
-        else:
-            report["connection_error"] = "no_devices_discovered"
-            return report
-
-        n.connectToDevice()
-        await n.waitForConnection()
-        if n._connection_error:  # noqa: SLF001
-            report["connection_error"] = n._connection_error  # noqa: SLF001
+        if not await _async_open(n, report, device_id, host, port):
             return report
-
-        got_data = await n.waitForData()
-        if not got_data:
-            report["connection_error"] = "connected_but_no_data"
-            return report
-
-        for key in _all_class_values(GenvexNabtoDatapointKey):
-            if n.providesValue(key) and n.hasValue(key):
-                report["datapoints"][key] = n.getValue(key)
-
-        for key in _all_class_values(GenvexNabtoSetpointKey):
-            if n.providesValue(key) and n.hasValue(key):
-                report["setpoints"][key] = {
-                    "value": n.getValue(key),
-                    "min": n.getSetpointMinValue(key),
-                    "max": n.getSetpointMaxValue(key),
-                    "step": n.getSetpointStep(key),
-                }
-
+        _collect_values(n, report)
         report["ok"] = True
         return report
     finally:
@@ -102,8 +190,9 @@ async def run_nabto_setpoint(
     port: int,
     key: str,
     value: float,
+    discovery_cache: GenvexNabtoDiscoveryCache | None = None,
 ) -> dict[str, Any]:
-    n = GenvexNabto(email)
+    n = GenvexNabto(email, discoveryCache=discovery_cache)
     report: dict[str, Any] = {
         "mode": "nabto-setpoint",
         "timestamp_utc": _utc_now_iso(),
@@ -116,65 +205,214 @@ async def run_nabto_setpoint(
     }
 
     try:
-        discovered = await n.discoverDevices(clear=True)
-
-        if host:
-            n.setManualIP(host, port)
-            report["selected_device"] = {"mode": "manual_ip", "host": host, "port": port}
-        elif device_id:
-            n.setDevice(device_id)
-            found = await n.waitForDiscovery()
-            report["selected_device"] = {"mode": "device_id", "device_id": device_id, "found": found}
-            if not found:
-                report["connection_error"] = "device_not_discovered"
-                return report
-        elif discovered:
-            first = next(iter(discovered.items()))
-            n.setDevice(first[0])
-            report["selected_device"] = {
-                "mode": "first_discovered",
-                "device_id": first[0],
-                "host": first[1][0],
-                "port": first[1][1],
-            }
-        else:
-            report["connection_error"] = "no_devices_discovered"
+        if not await _async_open(n, report, device_id, host, port):
             return report
 
-        n.connectToDevice()
-        await n.waitForConnection()
-        if n._connection_error:  # noqa: SLF001
-            report["connection_error"] = n._connection_error  # noqa: SLF001
-            return report
+        return await _async_write_setpoint(n, report, key, value)
+    finally:
+        try:
+            n.stopListening()
+        except Exception:
+            pass
 
-        got_data = await n.waitForData()
-        if not got_data:
-            report["connection_error"] = "connected_but_no_data"
-            return report
 
-        if not n.providesValue(key):
-            report["connection_error"] = "setpoint_not_supported"
+class NilanNabtoSession:
+    """Long-lived connection to one device.
+
+    The client connects once and keeps itself fresh: a loop timer re-requests each
+    datapoint tier when due and the setpoints every SETPOINT_UPDATEINTERVAL, and
+    re-sends U_CONNECT after SECONDS_UNTILRECONNECT without a reply. Those requests
+    keep the device session alive, so no separate keep-alive is sent. A snapshot
+    only reads the cached values.
+    Sessions given the same hub share one socket instead of opening one each, and a
+    discovery cache lets a (re)connect use the last known address without broadcasting.
+    Packet and latency metrics and the datapoint history outlive the clients, so they keep
+    adding up across reconnects.
+    """
+
+    def __init__(
+        self,
+        email: str,
+        device_id: str | None,
+        host: str | None,
+        port: int,
+        poll_intervals: dict[str, int] | None = None,
+        deadbands: dict[str, Any] | None = None,
+        hub: GenvexNabtoHub | None = None,
+        discovery_cache: GenvexNabtoDiscoveryCache | None = None,
+    ) -> None:
+        self._email = email
+        self._hub = hub
+        self._discovery_cache = discovery_cache
+        self._device_id = device_id
+        self._host = host
+        self._port = port
+        self._poll_intervals = poll_intervals or {}
+        self._deadbands = deadbands or {}
+        self._update_callback: Callable[[str, str, Any], None] | None = None
+        self._model_info: dict[str, Any] | None = None
+        self._client: GenvexNabto | None = None
+        self._selected_device: dict[str, Any] | None = None
+        self._metrics = GenvexNabtoMetrics()
+        self._history = GenvexNabtoHistory()
+        self._lock = asyncio.Lock()
+
+    @property
+    def client(self) -> GenvexNabto | None:
+        return self._client
+
+    @property
+    def metrics(self) -> GenvexNabtoMetrics:
+        return self._metrics
+
+    @property
+    def history(self) -> GenvexNabtoHistory:
+        return self._history
+
+    @property
+    def selected_device(self) -> dict[str, Any] | None:
+        return self._selected_device
+
+    def cached_fingerprint(self) -> tuple | None:
+        """The model fingerprint the discovery cache remembers for this session's device, if any."""
+        if self._discovery_cache is None:
+            return None
+        # A manual host is cached under the address without dots, the id GenvexNabto.setManualIP gives it.
+        device_id = self._host.replace(".", "") if self._host else self._device_id
+        if not device_id:
+            return None
+        return self._discovery_cache.getFingerprint(device_id)
+
+    def set_update_callback(self, update_callback: Callable[[str, str, Any], None] | None) -> None:
+        """Call update_callback(source, key, new_value) whenever the device reports a new or changed value.
+
+        source is "datapoints" or "setpoints".
+
+        Handlers fire from the client's datagram protocol, which runs on the loop
+        the session was connected from.
+        """
+        self._update_callback = update_callback
+
+    def _handle_update(self, source: str, key: str, _old_value: Any, new_value: Any) -> None:
+        if self._update_callback is not None:
+            self._update_callback(source, key, new_value)
+
+    def _register_update_handlers(self, n: GenvexNabto) -> None:
+        for source, keys in (
+            ("datapoints", _all_class_values(GenvexNabtoDatapointKey)),
+            ("setpoints", _all_class_values(GenvexNabtoSetpointKey)),
+        ):
+            for key in keys:
+                if n.providesValue(key):
+                    n.registerUpdateHandler(key, partial(self._handle_update, source, key))
+        # A new client does not know the previous values, so push everything once.
+        n.notifyAllUpdateHandlers()
+
+    def is_alive(self) -> bool:
+        n = self._client
+        if n is None or not n._is_connected or n._connection_error:  # noqa: SLF001
+            return False
+        return time.time() - n._last_responce < SESSION_STALE_SECONDS  # noqa: SLF001
+
+    async def async_connect(self) -> dict[str, Any]:
+        """(Re)build the client. Returns a report carrying connection_error on failure."""
+        self.close()
+        n = GenvexNabto(self._email, hub=self._hub, discoveryCache=self._discovery_cache, metrics=self._metrics, history=self._history)
+        n.setPollIntervals(**self._poll_intervals)
+        n.setDeadbands(**self._deadbands)
+        report: dict[str, Any] = {"selected_device": None, "connection_error": None}
+        if not await _async_open(n, report, self._device_id, self._host, self._port):
+            try:
+                n.stopListening()
+            except Exception:
+                pass
             return report
+        self._client = n
+        self._selected_device = report["selected_device"]
+        self._model_info = _model_info(n)
+        self._register_update_handlers(n)
+        _LOGGER.debug("Nabto session established with %s", self._selected_device)
+        return report
 
-        min_value = n.getSetpointMinValue(key)
-        max_value = n.getSetpointMaxValue(key)
-        if value < min_value or value > max_value:
-            report["connection_error"] = "setpoint_out_of_range"
-            report["min"] = min_value
-            report["max"] = max_value
+    async def _async_ensure_client(self, report: dict[str, Any]) -> GenvexNabto | None:
+        """Return the live client, reconnecting first if the session went stale. Call with the lock held."""
+        if not self.is_alive():
+            if self._client is not None:
+                _LOGGER.debug("Nabto session went stale, reconnecting")
+            result = await self.async_connect()
+            if result["connection_error"]:
+                report["selected_device"] = result["selected_device"]
+                report["connection_error"] = result["connection_error"]
+                return None
+        report["selected_device"] = self._selected_device
+        return self._client
+
+    async def async_snapshot(self) -> dict[str, Any]:
+        """Return a probe-style report built from the live session, reconnecting if it went stale."""
+        report: dict[str, Any] = {
+            "mode": "nabto-session",
+            "timestamp_utc": _utc_now_iso(),
+            "ok": False,
+            "selected_device": None,
+            "connection_error": None,
+            "model": None,
+            "fingerprint": None,
+            "datapoints": {},
+            "setpoints": {},
+        }
+        async with self._lock:
+            n = await self._async_ensure_client(report)
+            if n is None:
+                return report
+            report["model"] = self._model_info
+            report["fingerprint"] = list(n.getFingerprint())
+            if n._last_dataupdate:  # noqa: SLF001
+                report["timestamp_utc"] = _utc_iso(n._last_dataupdate)  # noqa: SLF001
+            _collect_values(n, report)
+            report["ok"] = True
             return report
 
-        n.setSetpoint(key, value)
-        await asyncio.sleep(1.0)
-        n.sendSetpointStateRequest(201)
-        await asyncio.sleep(1.0)
-        report["readback_value"] = n.getValue(key)
-        report["ok"] = report["readback_value"] == value
-        if not report["ok"]:
-            report["connection_error"] = "setpoint_readback_mismatch"
-        return report
-    finally:
+    async def async_set_setpoint(self, key: str, value: float) -> dict[str, Any]:
+        """Write a setpoint over the live session, returning once the device confirms it."""
+        report: dict[str, Any] = {
+            "mode": "nabto-setpoint",
+            "timestamp_utc": _utc_now_iso(),
+            "ok": False,
+            "selected_device": None,
+            "connection_error": None,
+            "key": key,
+            "requested_value": value,
+            "readback_value": None,
+        }
+        # Hold the lock through the write, so a poll cannot find the session stale and close it mid-write
+        async with self._lock:
+            n = await self._async_ensure_client(report)
+            if n is None:
+                return report
+            return await _async_write_setpoint(n, report, key, value)
+
+    async def async_set_setpoints(self, values: dict[str, float]) -> dict[str, Any]:
+        """Write several setpoints as one packet over the live session, returning once the device confirms them."""
+        report: dict[str, Any] = {
+            "mode": "nabto-setpoints",
+            "timestamp_utc": _utc_now_iso(),
+            "ok": False,
+            "selected_device": None,
+            "connection_error": None,
+            "requested_values": dict(values),
+            "readback": {},
+        }
+        async with self._lock:
+            n = await self._async_ensure_client(report)
+            if n is None:
+                return report
+            return await _async_write_setpoints(n, report, values)
+
+    def close(self) -> None:
+        if self._client is None:
+            return
         try:
-            n.stopListening()
+            self._client.stopListening()
         except Exception:
             pass
+        self._client = None
@@ -1,10 +1,11 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from typing import Any
 
 from homeassistant.components.number import NumberEntity, NumberEntityDescription
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity import DeviceInfo
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
@@ -46,6 +47,27 @@ class NilanNabtoSetpointNumber(CoordinatorEntity[NilanNabtoCoordinator], NumberE
             manufacturer="Nilan",
             model="Nabto Gateway",
         )
+        self._last_written: tuple[Any, ...] | None = None
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        self._last_written = self._written_state()
+        self.async_on_remove(self.coordinator.async_add_key_listener(self._setpoint_key, self._async_write_state))
+
+    def _written_state(self) -> tuple[Any, ...]:
+        return (self.available, self.native_value, self.extra_state_attributes)
+
+    @callback
+    def _async_write_state(self) -> None:
+        self._last_written = self._written_state()
+        self.async_write_ha_state()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        # Values are pushed per key, so a poll only needs a state write when it changed what the entity shows:
+        # availability, a key first reported by this poll, refreshed setpoint limits or a replaced startup snapshot.
+        if self._written_state() != self._last_written:
+            self._async_write_state()
 
     @property
     def native_value(self) -> float | None:
@@ -57,7 +79,6 @@ class NilanNabtoSetpointNumber(CoordinatorEntity[NilanNabtoCoordinator], NumberE
 
     async def async_set_native_value(self, value: float) -> None:
         await self.coordinator.async_set_setpoint(self._setpoint_key, value)
-        await self.coordinator.async_request_refresh()
 
 
 async def async_setup_entry(
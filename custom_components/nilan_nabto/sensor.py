@@ -1,9 +1,8 @@
 from __future__ import annotations
 
+from collections.abc import Callable
 from dataclasses import dataclass
 from typing import Any
-import json
-from pathlib import Path
 
 from homeassistant.components.sensor import (
     SensorDeviceClass,
@@ -16,15 +15,19 @@ from homeassistant.const import (
     CONCENTRATION_PARTS_PER_MILLION,
     PERCENTAGE,
     REVOLUTIONS_PER_MINUTE,
+    EntityCategory,
     UnitOfTemperature,
+    UnitOfTime,
 )
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity import DeviceInfo
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
+from homeassistant.loader import async_get_integration
 
 from .const import CONF_DEVICE_ID, CONF_HOST, DOMAIN
 from .coordinator import NilanNabtoCoordinator
+from .vendor.genvexnabto import GenvexNabtoKeyClass, GenvexNabtoMetrics, classifyKey
 from .vendor.genvexnabto.models import GenvexNabtoDatapointKey, GenvexNabtoSetpointKey
 
 
@@ -35,15 +38,69 @@ class NilanSensorDescription:
     entity: SensorEntityDescription
 
 
-def _manifest_version() -> str:
-    try:
-        manifest_path = Path(__file__).resolve().parent / "manifest.json"
-        return str(json.loads(manifest_path.read_text(encoding="utf-8")).get("version", "unknown"))
-    except Exception:
-        return "unknown"
-
-
-INTEGRATION_VERSION = _manifest_version()
+@dataclass
+class NilanDiagnosticDescription:
+    entity: SensorEntityDescription
+    value: Callable[[GenvexNabtoMetrics], Any]
+
+
+def _round(value: float | None, digits: int) -> float | None:
+    return None if value is None else round(value, digits)
+
+
+# Where time and packets go on the link to the device. Packet counters are off by default.
+DIAGNOSTIC_DESCRIPTIONS: tuple[NilanDiagnosticDescription, ...] = (
+    NilanDiagnosticDescription(
+        SensorEntityDescription(
+            key="data_age",
+            name="Data age",
+            device_class=SensorDeviceClass.DURATION,
+            native_unit_of_measurement=UnitOfTime.SECONDS,
+            state_class=SensorStateClass.MEASUREMENT,
+        ),
+        lambda metrics: _round(metrics.getDataAge(), 1),
+    ),
+    NilanDiagnosticDescription(
+        SensorEntityDescription(
+            key="round_trip_time",
+            name="Round trip time",
+            device_class=SensorDeviceClass.DURATION,
+            native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+            state_class=SensorStateClass.MEASUREMENT,
+        ),
+        lambda metrics: _round(metrics.getRttMean("datapoints"), 1),
+    ),
+    NilanDiagnosticDescription(
+        SensorEntityDescription(key="reconnects", name="Reconnects", state_class=SensorStateClass.TOTAL_INCREASING),
+        lambda metrics: metrics.reconnects,
+    ),
+    NilanDiagnosticDescription(
+        SensorEntityDescription(key="retransmits", name="Retransmits", state_class=SensorStateClass.TOTAL_INCREASING),
+        lambda metrics: sum(metrics.retransmits.values()),
+    ),
+    NilanDiagnosticDescription(
+        SensorEntityDescription(key="request_timeouts", name="Request timeouts", state_class=SensorStateClass.TOTAL_INCREASING),
+        lambda metrics: sum(metrics.timeouts.values()),
+    ),
+    NilanDiagnosticDescription(
+        SensorEntityDescription(
+            key="packets_sent",
+            name="Packets sent",
+            state_class=SensorStateClass.TOTAL_INCREASING,
+            entity_registry_enabled_default=False,
+        ),
+        lambda metrics: sum(metrics.packetsSent.values()),
+    ),
+    NilanDiagnosticDescription(
+        SensorEntityDescription(
+            key="packets_received",
+            name="Packets received",
+            state_class=SensorStateClass.TOTAL_INCREASING,
+            entity_registry_enabled_default=False,
+        ),
+        lambda metrics: sum(metrics.packetsReceived.values()),
+    ),
+)
 
 
 def _all_class_values(cls) -> list[str]:
@@ -66,25 +123,26 @@ def _build_description(key: str, source: str) -> SensorEntityDescription:
         "key": f"{source}_{key}",
         "name": _friendly_name(key),
     }
-    if key.startswith("temp_") or key.endswith("_temp") or "temperature" in key:
+    key_class = classifyKey(key)
+    if key_class == GenvexNabtoKeyClass.TEMPERATURE:
         kwargs["device_class"] = SensorDeviceClass.TEMPERATURE
         kwargs["native_unit_of_measurement"] = UnitOfTemperature.CELSIUS
         kwargs["state_class"] = SensorStateClass.MEASUREMENT
-    elif "humidity" in key:
+    elif key_class == GenvexNabtoKeyClass.HUMIDITY:
         kwargs["device_class"] = SensorDeviceClass.HUMIDITY
         kwargs["native_unit_of_measurement"] = PERCENTAGE
         kwargs["state_class"] = SensorStateClass.MEASUREMENT
-    elif "co2" in key:
+    elif key_class == GenvexNabtoKeyClass.CO2:
         kwargs["device_class"] = SensorDeviceClass.CO2
         kwargs["native_unit_of_measurement"] = CONCENTRATION_PARTS_PER_MILLION
         kwargs["state_class"] = SensorStateClass.MEASUREMENT
-    elif "rpm" in key:
+    elif key_class == GenvexNabtoKeyClass.RPM:
         kwargs["native_unit_of_measurement"] = REVOLUTIONS_PER_MINUTE
         kwargs["state_class"] = SensorStateClass.MEASUREMENT
-    elif "pwm" in key:
+    elif key_class == GenvexNabtoKeyClass.PWM:
         kwargs["native_unit_of_measurement"] = PERCENTAGE
         kwargs["state_class"] = SensorStateClass.MEASUREMENT
-    elif key.endswith("_days") or "days" in key:
+    elif key_class == GenvexNabtoKeyClass.DAYS:
         kwargs["native_unit_of_measurement"] = "d"
         kwargs["state_class"] = SensorStateClass.MEASUREMENT
 
@@ -111,6 +169,29 @@ class NilanNabtoSensor(CoordinatorEntity[NilanNabtoCoordinator], SensorEntity):
             manufacturer="Nilan",
             model="Nabto Gateway",
         )
+        self._last_written: tuple[Any, ...] | None = None
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        self._last_written = self._written_state()
+        self.async_on_remove(
+            self.coordinator.async_add_key_listener(self._nilan_description.key, self._async_write_state)
+        )
+
+    def _written_state(self) -> tuple[Any, ...]:
+        return (self.available, self.native_value, self.extra_state_attributes)
+
+    @callback
+    def _async_write_state(self) -> None:
+        self._last_written = self._written_state()
+        self.async_write_ha_state()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        # Values are pushed per key, so a poll only needs a state write when it changed what the entity shows:
+        # availability, a key first reported by this poll, refreshed setpoint limits or a replaced startup snapshot.
+        if self._written_state() != self._last_written:
+            self._async_write_state()
 
     @property
     def native_value(self):
@@ -140,8 +221,9 @@ class NilanNabtoSensor(CoordinatorEntity[NilanNabtoCoordinator], SensorEntity):
 
 
 class NilanStatusSensor(CoordinatorEntity[NilanNabtoCoordinator], SensorEntity):
-    def __init__(self, coordinator: NilanNabtoCoordinator, entry: ConfigEntry) -> None:
+    def __init__(self, coordinator: NilanNabtoCoordinator, entry: ConfigEntry, integration_version: str) -> None:
         super().__init__(coordinator)
+        self._integration_version = integration_version
         host = entry.data.get(CONF_HOST, "unknown")
         self._attr_unique_id = f"{entry.entry_id}_status"
         self._attr_name = "Nilan status"
@@ -154,18 +236,55 @@ class NilanStatusSensor(CoordinatorEntity[NilanNabtoCoordinator], SensorEntity):
 
     @property
     def native_value(self):
+        if self.coordinator.is_stale:
+            return "stale"  # Values restored from the last run, the device has not answered yet
         return "ok" if (self.coordinator.data or {}).get("ok") else "error"
 
     @property
     def extra_state_attributes(self) -> dict[str, Any]:
         data = self.coordinator.data or {}
         return {
-            "integration_version": INTEGRATION_VERSION,
+            "integration_version": self._integration_version,
             "timestamp_utc": data.get("timestamp_utc"),
             "connection_error": data.get("connection_error"),
+            "stale": self.coordinator.is_stale,
         }
 
 
+class NilanDiagnosticSensor(CoordinatorEntity[NilanNabtoCoordinator], SensorEntity):
+    """A counter or latency of the Nabto session, refreshed with every coordinator poll."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def __init__(
+        self,
+        coordinator: NilanNabtoCoordinator,
+        entry: ConfigEntry,
+        description: NilanDiagnosticDescription,
+    ) -> None:
+        super().__init__(coordinator)
+        self._nilan_description = description
+        self.entity_description = description.entity
+        host = entry.data.get(CONF_HOST, "unknown")
+        self._attr_unique_id = f"{entry.entry_id}_diagnostic_{description.entity.key}"
+        self._attr_name = f"Nilan {description.entity.name}"
+        self._attr_device_info = DeviceInfo(
+            identifiers={(DOMAIN, str(entry.data.get(CONF_DEVICE_ID) or host))},
+            name=f"Nilan {host}",
+            manufacturer="Nilan",
+            model="Nabto Gateway",
+        )
+
+    @property
+    def available(self) -> bool:
+        # Counters stay meaningful while the device is unreachable; that is when they matter most.
+        return True
+
+    @property
+    def native_value(self):
+        return self._nilan_description.value(self.coordinator.metrics)
+
+
 async def async_setup_entry(
     hass: HomeAssistant,
     entry: ConfigEntry,
@@ -173,10 +292,17 @@ async def async_setup_entry(
 ) -> None:
     coordinator: NilanNabtoCoordinator = hass.data[DOMAIN][entry.entry_id]
 
-    entities: list[SensorEntity] = [NilanStatusSensor(coordinator, entry)]
+    # The manifest was already read by Home Assistant's loader, so this does no file I/O on the loop.
+    integration = await async_get_integration(hass, DOMAIN)
+    integration_version = str(integration.version or "unknown")
+
+    entities: list[SensorEntity] = [NilanStatusSensor(coordinator, entry, integration_version)]
+    entities.extend(NilanDiagnosticSensor(coordinator, entry, description) for description in DIAGNOSTIC_DESCRIPTIONS)
 
-    datapoint_keys = sorted(set(_all_class_values(GenvexNabtoDatapointKey)))
-    setpoint_keys = sorted(set(_all_class_values(GenvexNabtoSetpointKey)))
+    # Only create entities for keys the connected model provides; fall back to every known key
+    # when the model has never been seen.
+    datapoint_keys = sorted(set(coordinator.provided_keys("datapoints") or _all_class_values(GenvexNabtoDatapointKey)))
+    setpoint_keys = sorted(set(coordinator.provided_keys("setpoints") or _all_class_values(GenvexNabtoSetpointKey)))
 
     for key in datapoint_keys:
         entities.append(
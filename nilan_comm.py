@@ -2,10 +2,12 @@
 import argparse
 import asyncio
 import json
+import os
 import sys
+import time
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import List, Optional
+from typing import Callable, List, Optional
 
 
 def _all_class_values(cls) -> List[str]:
@@ -38,24 +40,16 @@ def _prefer_vendored_genvexnabto() -> dict:
     return {"used": False, "reason": "vendored_package_not_found"}
 
 
-async def run_nabto_probe(email: str, device_id: Optional[str], host: Optional[str], port: int):
-    vendor_info = _prefer_vendored_genvexnabto()
-    if not vendor_info.get("used"):
-        return {"mode": "nabto-probe", "ok": False, "vendor": vendor_info, "error": "Vendored genvexnabto missing"}
+# Upper bound for one device in fleet mode: discovery, connect and first data timeouts back to back
+FLEET_DEVICE_TIMEOUT = 20
+FLEET_CONCURRENCY = 8
 
-    try:
-        from genvexnabto import GenvexNabto
-        from genvexnabto.models import GenvexNabtoDatapointKey, GenvexNabtoSetpointKey
-    except Exception as exc:
-        return {
-            "mode": "nabto-probe",
-            "ok": False,
-            "vendor": vendor_info,
-            "error": f"Failed importing genvexnabto: {exc}",
-        }
-
-    n = GenvexNabto(email)
-    report = {
+# State kept between runs goes to the per-user cache directory, not the working directory
+STATE_DIR = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "nilan"
+
+
+def _new_probe_report(vendor_info: dict) -> dict:
+    return {
         "mode": "nabto-probe",
         "timestamp_utc": _utc_now_iso(),
         "ok": False,
@@ -63,14 +57,49 @@ async def run_nabto_probe(email: str, device_id: Optional[str], host: Optional[s
         "discovered_devices": {},
         "selected_device": None,
         "connection_error": None,
+        "fingerprint": None,
         "datapoints": {},
         "setpoints": {},
     }
 
-    try:
-        discovered = await n.discoverDevices(clear=True)
-        report["discovered_devices"] = {k: [v[0], v[1]] for k, v in discovered.items()}
 
+def _collect_values(n, report: dict) -> None:
+    from genvexnabto.models import GenvexNabtoDatapointKey, GenvexNabtoSetpointKey
+
+    for key in _all_class_values(GenvexNabtoDatapointKey):
+        if n.providesValue(key) and n.hasValue(key):
+            report["datapoints"][key] = n.getValue(key)
+
+    for key in _all_class_values(GenvexNabtoSetpointKey):
+        if n.providesValue(key) and n.hasValue(key):
+            report["setpoints"][key] = {
+                "value": n.getValue(key),
+                "min": n.getSetpointMinValue(key),
+                "max": n.getSetpointMaxValue(key),
+                "step": n.getSetpointStep(key),
+            }
+
+
+async def _probe_device(
+    report: dict,
+    email: str,
+    device_id: Optional[str],
+    host: Optional[str],
+    port: int,
+    discovery_cache,
+    hub=None,
+    capture_path: Optional[str] = None,
+) -> dict:
+    """Connect to one device and fill report with its values. Call after the vendored package imported."""
+    from genvexnabto import GenvexNabto, GenvexNabtoCapture
+
+    n = GenvexNabto(email, hub=hub, discoveryCache=discovery_cache)
+    capture = GenvexNabtoCapture(capture_path) if capture_path else None
+    n.setCapture(capture)
+    try:
+        # Broadcast for every device only when there is no target; a device id is looked up
+        # in the discovery cache first, and otherwise broadcast for on its own.
+        await n.startListening()
         if host:
             n.setManualIP(host, port)
             report["selected_device"] = {"mode": "manual_ip", "host": host, "port": port}
@@ -81,13 +110,14 @@ async def run_nabto_probe(email: str, device_id: Optional[str], host: Optional[s
             if not found:
                 report["connection_error"] = "device_not_discovered"
                 return report
-        elif discovered:
+        elif discovered := await n.discoverDevices(clear=True):
             first = next(iter(discovered.items()))
             n.setDevice(first[0])
             report["selected_device"] = {"mode": "first_discovered", "device_id": first[0], "host": first[1][0], "port": first[1][1]}
         else:
             report["connection_error"] = "no_devices_discovered"
             return report
+        report["discovered_devices"] = {k: [v[0], v[1]] for k, v in n._discovered_devices.items()}  # noqa: SLF001
 
         n.connectToDevice()
         await n.waitForConnection()
@@ -100,19 +130,8 @@ async def run_nabto_probe(email: str, device_id: Optional[str], host: Optional[s
             report["connection_error"] = "connected_but_no_data"
             return report
 
-        for key in _all_class_values(GenvexNabtoDatapointKey):
-            if n.providesValue(key) and n.hasValue(key):
-                report["datapoints"][key] = n.getValue(key)
-
-        for key in _all_class_values(GenvexNabtoSetpointKey):
-            if n.providesValue(key) and n.hasValue(key):
-                report["setpoints"][key] = {
-                    "value": n.getValue(key),
-                    "min": n.getSetpointMinValue(key),
-                    "max": n.getSetpointMaxValue(key),
-                    "step": n.getSetpointStep(key),
-                }
-
+        _collect_values(n, report)
+        report["fingerprint"] = list(n.getFingerprint())
         report["ok"] = True
         return report
     finally:
@@ -120,11 +139,251 @@ async def run_nabto_probe(email: str, device_id: Optional[str], host: Optional[s
             n.stopListening()
         except Exception:
             pass
+        if capture is not None:
+            capture.close()
+            report["capture"] = {"path": capture_path, "packets": capture.records}
+
+
+def _import_genvexnabto(mode: str):
+    """Return (vendor_info, error_report); error_report is None when the vendored package imports."""
+    vendor_info = _prefer_vendored_genvexnabto()
+    if not vendor_info.get("used"):
+        return vendor_info, {"mode": mode, "ok": False, "vendor": vendor_info, "error": "Vendored genvexnabto missing"}
+    try:
+        import genvexnabto  # noqa: F401
+    except Exception as exc:
+        return vendor_info, {"mode": mode, "ok": False, "vendor": vendor_info, "error": f"Failed importing genvexnabto: {exc}"}
+    return vendor_info, None
+
+
+def _load_discovery_cache(path: Optional[str]):
+    from genvexnabto import GenvexNabtoDiscoveryCache
+
+    discovery_cache = GenvexNabtoDiscoveryCache()
+    if path:
+        discovery_cache.load(path)
+    return discovery_cache
+
+
+def _save_discovery_cache(discovery_cache, path: Optional[str]) -> None:
+    if path:
+        try:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            discovery_cache.save(path)
+        except OSError:
+            pass
+
+
+async def run_nabto_probe(
+    email: str,
+    device_id: Optional[str],
+    host: Optional[str],
+    port: int,
+    discovery_cache_path: Optional[str] = None,
+    snapshot_path: Optional[str] = None,
+    capture_path: Optional[str] = None,
+):
+    """Probe one device. With snapshot_path, a good report is kept there and a failed one carries it as last_known.
+    With capture_path, every packet of the session is recorded there for run_nabto_replay."""
+    vendor_info, error_report = _import_genvexnabto("nabto-probe")
+    if error_report is not None:
+        return error_report
+
+    discovery_cache = _load_discovery_cache(discovery_cache_path)
+    try:
+        report = await _probe_device(
+            _new_probe_report(vendor_info), email, device_id, host, port, discovery_cache, capture_path=capture_path
+        )
+    finally:
+        _save_discovery_cache(discovery_cache, discovery_cache_path)
+    if snapshot_path:
+        snapshots = _load_snapshots(snapshot_path)
+        target = {"host": host, "port": port, "device_id": device_id}
+        _apply_snapshot(snapshots, _gateway_name(target) if host or device_id else None, report)
+        _save_snapshots(snapshot_path, snapshots)
+    return report
+
+
+async def run_nabto_replay(capture_path: str, speed: float = 0) -> dict:
+    """Feed a capture made with --capture through a fresh client and report the values it decoded.
+    A speed of 1 keeps the recorded timing, 0 replays as fast as possible."""
+    vendor_info, error_report = _import_genvexnabto("nabto-replay")
+    if error_report is not None:
+        return error_report
+    from genvexnabto import GenvexNabto, GenvexNabtoReplay
+
+    report = _new_probe_report(vendor_info)
+    report["mode"] = "nabto-replay"
+    report["capture"] = {"path": capture_path}
+    try:
+        replay = GenvexNabtoReplay.load(capture_path)
+    except (OSError, ValueError) as e:
+        report["connection_error"] = f"capture_unreadable: {e}"
+        return report
+    n = GenvexNabto()
+    started = time.perf_counter()
+    received = await replay.run(n, speed)
+    report["capture"].update(
+        {"packets": len(replay.records), "received": received, "elapsed_seconds": round(time.perf_counter() - started, 3)}
+    )
+    if n._model_adapter is None:  # noqa: SLF001
+        report["connection_error"] = "no_model_in_capture"
+        return report
+    _collect_values(n, report)
+    report["fingerprint"] = list(n.getFingerprint())
+    report["ok"] = True
+    return report
+
+
+def _load_snapshots(path: Optional[str]) -> dict:
+    """Last good probe report per device, from the snapshot file."""
+    if not path:
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            snapshots = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return snapshots if isinstance(snapshots, dict) else {}
+
+
+def _save_snapshots(path: Optional[str], snapshots: dict) -> None:
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    try:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshots, f, indent=2)
+        Path(tmp_path).replace(path)
+    except OSError:
+        pass
+
+
+def _apply_snapshot(snapshots: dict, key: Optional[str], report: dict) -> None:
+    """Remember a good report under key, or attach the last good one to a failed report as last_known."""
+    if report.get("ok"):
+        selected = report.get("selected_device") or {}
+        key = key or selected.get("device_id")
+        if key:
+            snapshots[key] = {name: value for name, value in report.items() if name not in ("vendor", "last_known")}
+    elif key and key in snapshots:
+        report["last_known"] = snapshots[key]
+
+
+def _gateway_name(gateway: dict) -> str:
+    if gateway.get("name"):
+        return str(gateway["name"])
+    if gateway.get("host"):
+        return f"{gateway['host']}:{int(gateway.get('port', 5570))}"
+    return str(gateway.get("device_id"))
+
+
+async def run_nabto_fleet(
+    email: str,
+    gateways: List[dict],
+    discovery_cache_path: Optional[str] = None,
+    concurrency: int = FLEET_CONCURRENCY,
+    timeout: float = FLEET_DEVICE_TIMEOUT,
+    on_report: Optional[Callable[[dict], None]] = None,
+    snapshot_path: Optional[str] = None,
+):
+    """Probe many devices at once over one shared socket.
+
+    Broadcasts a single discovery first if any gateway is neither given by host nor found in the
+    discovery cache, then probes every gateway concurrently, at most concurrency at a time and each
+    within timeout seconds. Without gateways, every discovered device is probed. on_report is
+    called with each device report as soon as it is done."""
+    vendor_info, error_report = _import_genvexnabto("nabto-fleet")
+    if error_report is not None:
+        return error_report
+    from genvexnabto import GenvexNabto, GenvexNabtoHub
+
+    started = time.monotonic()
+    discovery_cache = _load_discovery_cache(discovery_cache_path)
+    snapshots = _load_snapshots(snapshot_path)
+    hub = GenvexNabtoHub()
+    fleet = {
+        "mode": "nabto-fleet",
+        "timestamp_utc": _utc_now_iso(),
+        "ok": False,
+        "vendor": vendor_info,
+        "discovered_devices": {},
+        "devices": [],
+    }
+
+    try:
+        needs_discovery = not gateways or any(
+            not gateway.get("host") and not (gateway.get("device_id") and discovery_cache.isUsable(gateway["device_id"]))
+            for gateway in gateways
+        )
+        if needs_discovery:
+            scout = GenvexNabto(email, hub=hub, discoveryCache=discovery_cache)
+            try:
+                discovered = await scout.discoverDevices(clear=True)
+            finally:
+                scout.stopListening()
+            fleet["discovered_devices"] = {k: [v[0], v[1]] for k, v in discovered.items()}
+        if not gateways:
+            gateways = [{"device_id": device_id} for device_id in fleet["discovered_devices"]]
+
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def probe(gateway: dict) -> dict:
+            report = _new_probe_report(vendor_info)
+            report["gateway"] = _gateway_name(gateway)
+            device_id = gateway.get("device_id") or None
+            host = gateway.get("host") or None
+            async with semaphore:
+                if not device_id and not host:
+                    report["connection_error"] = "gateway_without_target"
+                else:
+                    try:
+                        await asyncio.wait_for(
+                            _probe_device(
+                                report,
+                                gateway.get("email") or email,
+                                device_id,
+                                host,
+                                int(gateway.get("port", 5570)),
+                                discovery_cache,
+                                hub,
+                            ),
+                            timeout,
+                        )
+                    except asyncio.TimeoutError:
+                        report["connection_error"] = report["connection_error"] or "probe_timeout"
+            if snapshot_path:
+                _apply_snapshot(snapshots, report["gateway"], report)
+            if on_report is not None:
+                on_report(report)
+            return report
+
+        fleet["devices"] = list(await asyncio.gather(*(probe(gateway) for gateway in gateways)))
+    finally:
+        _save_discovery_cache(discovery_cache, discovery_cache_path)
+        _save_snapshots(snapshot_path, snapshots)
+
+    fleet["ok_count"] = sum(1 for report in fleet["devices"] if report["ok"])
+    fleet["failed_count"] = len(fleet["devices"]) - fleet["ok_count"]
+    fleet["ok"] = bool(fleet["devices"]) and fleet["failed_count"] == 0
+    fleet["elapsed_seconds"] = round(time.monotonic() - started, 3)
+    return fleet
 
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Nilan CodeWizard communication helper")
     parser.add_argument("--settings", default="settings.json", help="Path to settings JSON file")
+    parser.add_argument(
+        "--discovery-cache",
+        default=str(STATE_DIR / "discovery_cache.json"),
+        help="Path to the JSON file remembering device addresses between runs (default: %(default)s, empty to disable)",
+    )
+    parser.add_argument(
+        "--snapshot",
+        default=str(STATE_DIR / "last_snapshot.json"),
+        help="Path to the JSON file keeping each device's last good report, added as last_known when a probe fails (default: %(default)s, empty to disable)",
+    )
     sub = parser.add_subparsers(dest="mode")
 
     p_nabto = sub.add_parser("nabto", help="Probe using community genvexnabto protocol")
@@ -132,6 +391,20 @@ def parse_args():
     p_nabto.add_argument("--device-id", help="Device id (often contains remote.lscontrol.dk)")
     p_nabto.add_argument("--host", help="Manual device IP")
     p_nabto.add_argument("--port", type=int, help="Manual device port")
+    p_nabto.add_argument("--capture", help="Record every packet of the session to this file, for replay")
+
+    p_replay = sub.add_parser("replay", help="Decode a capture made with nabto --capture, without a device")
+    p_replay.add_argument("capture", help="Capture file")
+    p_replay.add_argument("--speed", type=float, default=0, help="1 replays at the recorded pace, 0 as fast as possible")
+
+    p_fleet = sub.add_parser(
+        "fleet",
+        help="Probe every gateway in settings.json concurrently (every discovered device if none are listed)",
+    )
+    p_fleet.add_argument("--email", help="Authorized email, unless a gateway sets its own")
+    p_fleet.add_argument("--concurrency", type=int, default=FLEET_CONCURRENCY, help="Devices probed at the same time")
+    p_fleet.add_argument("--timeout", type=float, default=FLEET_DEVICE_TIMEOUT, help="Seconds allowed per device")
+    p_fleet.add_argument("--ndjson", action="store_true", help="Print one JSON line per device as it finishes, then a summary line")
 
     return parser.parse_args()
 
@@ -149,6 +422,42 @@ def _resolve_nabto_params(args, gateway: dict, auth: dict):
     return email, device_id, host, port
 
 
+def _resolve_fleet_gateways(settings: dict) -> List[dict]:
+    """The gateways list from settings, or the single gateway if it names a device."""
+    gateways = settings.get("gateways")
+    if gateways:
+        return list(gateways)
+    gateway = settings.get("gateway", {})
+    if gateway.get("host") or gateway.get("device_id"):
+        return [gateway]
+    return []
+
+
+def _run_fleet(args, settings: dict, ndjson: bool = False) -> dict:
+    auth = settings.get("auth", {})
+    email = getattr(args, "email", None) or auth.get("email")
+    if not email:
+        raise SystemExit("Email missing. Provide --email or set auth.email in settings.json")
+
+    def print_line(report: dict) -> None:
+        print(json.dumps(report), flush=True)
+
+    fleet = asyncio.run(
+        run_nabto_fleet(
+            email,
+            _resolve_fleet_gateways(settings),
+            args.discovery_cache,
+            getattr(args, "concurrency", FLEET_CONCURRENCY),
+            getattr(args, "timeout", FLEET_DEVICE_TIMEOUT),
+            print_line if ndjson else None,
+            args.snapshot,
+        )
+    )
+    if ndjson:
+        print_line({key: value for key, value in fleet.items() if key != "devices"})
+    return fleet
+
+
 def main():
     args = parse_args()
     settings = {}
@@ -161,9 +470,17 @@ def main():
     auth = settings.get("auth", {})
     if args.mode == "nabto":
         email, device_id, host, port = _resolve_nabto_params(args, gateway, auth)
-        report = asyncio.run(run_nabto_probe(email, device_id, host, port))
+        report = asyncio.run(run_nabto_probe(email, device_id, host, port, args.discovery_cache, args.snapshot, args.capture))
         print(json.dumps(report, indent=2))
         return
+    if args.mode == "replay":
+        print(json.dumps(asyncio.run(run_nabto_replay(args.capture, args.speed)), indent=2))
+        return
+    if args.mode == "fleet":
+        fleet = _run_fleet(args, settings, ndjson=args.ndjson)
+        if not args.ndjson:
+            print(json.dumps(fleet, indent=2))
+        return
 
     # Direct run mode: no subcommand -> use settings.json mode toggles.
     mode_cfg = settings.get("mode", {})
@@ -171,9 +488,11 @@ def main():
     combined = {"mode": "direct-run", "settings": args.settings, "nabto": None}
     combined["timestamp_utc"] = _utc_now_iso()
 
-    if run_nabto:
+    if run_nabto and settings.get("gateways"):
+        combined["nabto"] = _run_fleet(args, settings)
+    elif run_nabto:
         email, device_id, host, port = _resolve_nabto_params(args, gateway, auth)
-        combined["nabto"] = asyncio.run(run_nabto_probe(email, device_id, host, port))
+        combined["nabto"] = asyncio.run(run_nabto_probe(email, device_id, host, port, args.discovery_cache, args.snapshot))
 
     print(json.dumps(combined, indent=2))
     return
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""Local UDP stand-in for a Nilan/Genvex unit speaking the Nabto protocol.
+
+Answers discovery, U_CONNECT, ping and the datapoint/setpoint read and write list
+commands, so GenvexNabto can be tested and benchmarked without hardware. Datapoints
+drift slowly over time, setpoint writes are remembered and read back. Latency,
+jitter, packet loss, reordering and slow setpoint writes can be dialled in.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+DEFAULT_DEVICE_ID = "simulator.remote.lscontrol.dk"
+# (model, deviceNumber, slaveDeviceNumber, slaveDeviceModel) as answered to ping
+FINGERPRINTS = {
+    "cts602": (1140, 0, 2763306, 3),
+    "cts602light": (1140, 0, 2763306, 2),
+    "cts400": (1140, 0, 72270, 1),
+    "optima270": (2010, 79265, 0, 0),
+    "optima314": (2020, 79280, 0, 0),
+    "optima312": (1040, 0, 79250, 9),
+    "optima301": (1040, 0, 79250, 5),
+    "optima260": (1040, 0, 70810, 26),
+    "optima251": (1040, 0, 79250, 8),
+    "optima250": (1040, 0, 79250, 1),
+}
+
+PACKET_U_CONNECT = 0x83
+PACKET_DATA = 0x16
+PAYLOAD_CRYPT = 0x36
+COMMAND_DATAPOINT_READLIST = 0x2D
+COMMAND_SETPOINT_READLIST = 0x2A
+COMMAND_SETPOINT_WRITELIST = 0x2B
+COMMAND_PING = 0x11
+DISCOVERY_REQUEST = b"\x00\x00\x00\x01"
+DISCOVERY_RESPONSE = b"\x00\x80\x00\x01"
+
+
+def _prefer_vendored_genvexnabto() -> None:
+    vendor_path = str(Path(__file__).resolve().parent / "vendor")
+    if vendor_path not in sys.path:
+        sys.path.insert(0, vendor_path)
+
+
+def _load_model_tables(fingerprint: Tuple[int, int, int, int]):
+    """Datapoint dividers and setpoint definitions of the simulated model, for plausible values."""
+    _prefer_vendored_genvexnabto()
+    from genvexnabto.models import loadModel
+
+    model = loadModel(*fingerprint)
+    if model is None:
+        return {}, {}
+    datapoints = {(record.obj, record.address): record for record in model._datapoints.values()}
+    setpoints = {(record.read_obj, record.read_address): record for record in model._setpoints.values()}
+    return datapoints, setpoints
+
+
+class NilanSimulator(asyncio.DatagramProtocol):
+    """One simulated device. Bind it with start(); stats counts packets by kind."""
+
+    def __init__(
+        self,
+        device_id: str = DEFAULT_DEVICE_ID,
+        fingerprint: Tuple[int, int, int, int] = FINGERPRINTS["cts602"],
+        authorized_email: Optional[str] = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        loss: float = 0.0,
+        reorder: float = 0.0,
+        write_delay: float = 0.0,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.device_id = device_id
+        self.fingerprint = fingerprint
+        self.authorized_email = authorized_email
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.reorder = reorder
+        self.write_delay = write_delay  # Seconds a setpoint write takes to apply; it is answered once applied
+        self.stats: Counter = Counter()
+        self._random = random.Random(seed)
+        self._server_id = self._random.getrandbits(32).to_bytes(4, "big")
+        self._started = time.monotonic()
+        self._datapoints, setpoint_records = _load_model_tables(fingerprint)
+        self._setpoint_records = setpoint_records
+        # Raw setpoint values by (read_obj, read_address), starting in the middle of each range
+        self._setpoints: Dict[Tuple[int, int], int] = {
+            key: (record.min + record.max) // 2 for key, record in setpoint_records.items()
+        }
+        self._write_to_read = {
+            (record.write_obj, record.write_address): key for key, record in setpoint_records.items()
+        }
+        self._transport: Optional[asyncio.DatagramTransport] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> Tuple[str, int]:
+        """Bind the simulator and return its (host, port)."""
+        loop = asyncio.get_running_loop()
+        self._transport, _ = await loop.create_datagram_endpoint(lambda: self, local_addr=(host, port))
+        return self._transport.get_extra_info("sockname")[:2]
+
+    def close(self) -> None:
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def setpoint_value(self, read_obj: int, read_address: int) -> Optional[int]:
+        return self._setpoints.get((read_obj, read_address))
+
+    def datapoint_value(self, obj: int, address: int) -> int:
+        """A slow sine per address, scaled to look like a real reading for the model's divider."""
+        record = self._datapoints.get((obj, address))
+        divider = record.divider if record is not None else 1
+        offset = record.offset if record is not None else 0
+        phase = (address * 0.7) % (2 * math.pi)
+        wave = math.sin((time.monotonic() - self._started) / 60 + phase)
+        if divider > 1:
+            return int((20 + 3 * wave) * divider) - offset
+        return (address % 4) - offset
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        if data[0:4] == DISCOVERY_REQUEST:
+            self._handle_discovery(data, addr)
+        elif len(data) >= 16 and data[8] == PACKET_U_CONNECT:
+            self._handle_connect(data, addr)
+        elif len(data) >= 26 and data[8] == PACKET_DATA and data[16] == PAYLOAD_CRYPT:
+            self._handle_data(data, addr)
+        else:
+            self.stats["ignored"] += 1
+
+    def _handle_discovery(self, data: bytes, addr) -> None:
+        self.stats["discovery"] += 1
+        wanted = data[12:].split(b"\x00", 1)[0].decode("ascii", "replace")
+        if wanted not in ("*", self.device_id):
+            return
+        self._send(DISCOVERY_RESPONSE + bytes(15) + self.device_id.encode("ascii") + b"\x00", addr)
+
+    def _handle_connect(self, data: bytes, addr) -> None:
+        self.stats["u_connect"] += 1
+        accepted = self.authorized_email is None or self.authorized_email.encode("ascii") in data[16:]
+        body = bytes(4) + (b"\x00\x00\x00\x01" if accepted else b"\x00\x00\x00\x00") + self._server_id
+        self._send(self._header(data, PACKET_U_CONNECT, len(body)) + body, addr)
+
+    def _handle_data(self, data: bytes, addr) -> None:
+        command = data[25]
+        if command == COMMAND_PING:
+            self.stats["ping"] += 1
+            model, device_number, slave_number, slave_model = self.fingerprint
+            reply = bytes(4) + device_number.to_bytes(4, "big") + model.to_bytes(4, "big") + bytes(4) \
+                + slave_number.to_bytes(4, "big") + slave_model.to_bytes(4, "big")
+        elif command == COMMAND_DATAPOINT_READLIST:
+            self.stats["datapoint_readlist"] += 1
+            count = int.from_bytes(data[26:28], "big")
+            values = []
+            for position in range(count):
+                entry = data[28 + position * 5:33 + position * 5]
+                value = self.datapoint_value(entry[0], int.from_bytes(entry[1:5], "big"))
+                values.append(max(-0x8000, min(0x7FFF, value)).to_bytes(2, "big", signed=True))
+            reply = count.to_bytes(2, "big") + b"".join(values)
+        elif command == COMMAND_SETPOINT_READLIST:
+            self.stats["setpoint_readlist"] += 1
+            count = int.from_bytes(data[26:28], "big")
+            values = []
+            for position in range(count):
+                entry = data[28 + position * 3:31 + position * 3]
+                value = self._setpoints.get((entry[0], int.from_bytes(entry[1:3], "big")), 0)
+                values.append((value & 0xFFFF).to_bytes(2, "big"))
+            reply = b"\x00" + count.to_bytes(2, "big") + b"".join(values)
+        elif command == COMMAND_SETPOINT_WRITELIST:
+            self.stats["setpoint_writelist"] += 1
+            if self.write_delay > 0:
+                asyncio.get_running_loop().call_later(self.write_delay, self._apply_write, data, addr)
+            else:
+                self._apply_write(data, addr)
+            return
+        else:
+            self.stats["unknown_command"] += 1
+            return
+        self._reply(data, reply, addr)
+
+    def _apply_write(self, data: bytes, addr) -> None:
+        count = int.from_bytes(data[26:28], "big")
+        for position in range(count):
+            entry = data[28 + position * 7:35 + position * 7]
+            key = self._write_to_read.get((entry[0], int.from_bytes(entry[1:5], "big")))
+            if key is not None:
+                self._setpoints[key] = int.from_bytes(entry[5:7], "big")
+        self._reply(data, b"\x00", addr)
+
+    def _reply(self, data: bytes, reply: bytes, addr) -> None:
+        # Crypt payload: type, flags, length (crypto code + data), crypto code, data, then the checksum
+        payload = bytes([PAYLOAD_CRYPT, 0]) + (len(reply) + 2).to_bytes(2, "big") + b"\x00\x0a" + reply
+        packet = self._header(data, PACKET_DATA, len(payload) + 2) + payload
+        self._send(packet + (sum(packet) & 0xFFFF).to_bytes(2, "big"), addr)
+
+    def _header(self, request: bytes, packet_type: int, body_length: int) -> bytes:
+        # Echo the client id and sequence id so the client can match the reply to its request
+        return b"".join([
+            request[0:4],
+            self._server_id,
+            bytes([packet_type, 0x02, 0x00, 0x00]),
+            request[12:14],
+            (16 + body_length).to_bytes(2, "big"),
+        ])
+
+    def _send(self, packet: bytes, addr) -> None:
+        if self._transport is None:
+            return
+        if self.loss and self._random.random() < self.loss:
+            self.stats["dropped"] += 1
+            return
+        delay = self.latency + (self._random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+        if self.reorder and self._random.random() < self.reorder:
+            # Hold this reply back long enough for later ones to overtake it
+            delay += max(self.latency, 0.005) * 3
+            self.stats["reordered"] += 1
+        self.stats["sent"] += 1
+        if delay <= 0:
+            self._transport.sendto(packet, addr)
+        else:
+            asyncio.get_running_loop().call_later(delay, self._send_now, packet, addr)
+
+    def _send_now(self, packet: bytes, addr) -> None:
+        if self._transport is not None:
+            self._transport.sendto(packet, addr)
+
+
+def _parse_fingerprint(value: str) -> Tuple[int, int, int, int]:
+    if value in FINGERPRINTS:
+        return FINGERPRINTS[value]
+    parts = [int(part) for part in value.split(",")]
+    if len(parts) != 4:
+        raise argparse.ArgumentTypeError("expected a model name or model,deviceNumber,slaveDeviceNumber,slaveDeviceModel")
+    return tuple(parts)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1", help="Address to bind")
+    parser.add_argument("--port", type=int, default=5570, help="UDP port to bind (0 picks a free one)")
+    parser.add_argument("--device-id", default=DEFAULT_DEVICE_ID, help="Device id answered to discovery")
+    parser.add_argument(
+        "--model",
+        type=_parse_fingerprint,
+        default=FINGERPRINTS["cts602"],
+        help=f"One of {', '.join(FINGERPRINTS)} or a raw fingerprint model,deviceNumber,slaveDeviceNumber,slaveDeviceModel",
+    )
+    parser.add_argument("--email", help="Only accept U_CONNECT from this email (default: accept all)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added before every reply")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random +/- seconds on top of the latency")
+    parser.add_argument("--loss", type=float, default=0.0, help="Probability of dropping a reply")
+    parser.add_argument("--reorder", type=float, default=0.0, help="Probability of delaying a reply past later ones")
+    parser.add_argument("--write-delay", type=float, default=0.0, help="Seconds a setpoint write takes to apply")
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible loss and reordering")
+    return parser.parse_args()
+
+
+async def _serve(args) -> None:
+    simulator = NilanSimulator(
+        device_id=args.device_id,
+        fingerprint=args.model,
+        authorized_email=args.email,
+        latency=args.latency,
+        jitter=args.jitter,
+        loss=args.loss,
+        reorder=args.reorder,
+        write_delay=args.write_delay,
+        seed=args.seed,
+    )
+    host, port = await simulator.start(args.host, args.port)
+    print(json.dumps({"listening": [host, port], "device_id": simulator.device_id, "fingerprint": simulator.fingerprint}))
+    try:
+        await asyncio.Event().wait()
+    finally:
+        simulator.close()
+        print(json.dumps({"stats": dict(simulator.stats)}))
+
+
+def main():
+    try:
+        asyncio.run(_serve(parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
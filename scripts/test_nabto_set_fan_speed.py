@@ -80,17 +80,17 @@ async def _run(email: str, host: str | None, port: int, device_id: str | None, v
             print(f"ERROR: requested value {value} outside allowed range [{min_v}..{max_v}]")
             return 2
 
-        n.setSetpoint(key, value)
-        await asyncio.sleep(1.0)
-
-        # Request a fresh setpoint read instead of relying only on cached value.
-        n.sendSetpointStateRequest(201)
-        await asyncio.sleep(2.0)
+        # Sends the write and a fresh single-key readback, returning when the device answers.
+        try:
+            confirmed = await n.writeSetpoint(key, value)
+        except asyncio.TimeoutError:
+            print("ERROR: device did not answer the write")
+            return 2
 
         after = n.getValue(key)
         print(f"FAN_SPEED after={after}")
 
-        if after == value:
+        if confirmed:
             print("SUCCESS: fan speed write verified")
             return 0
 
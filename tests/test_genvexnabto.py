@@ -0,0 +1,397 @@
+import asyncio
+
+import nilan_comm
+
+nilan_comm._prefer_vendored_genvexnabto()
+
+from genvexnabto.genvexnabto_metrics import GenvexNabtoHistogram, GenvexNabtoMetrics  # noqa: E402
+from genvexnabto.genvexnabto_requesttracker import GenvexNabtoRequestKind, GenvexNabtoRequestTracker  # noqa: E402
+
+
+def test_request_tracker_allocates_unique_sequence_ids_and_skips_zero():
+    tracker = GenvexNabtoRequestTracker(lambda packet: True)
+    tracker._nextSequenceId = 0xFFFF
+    assert tracker.allocateSequenceId() == 0xFFFF
+    assert tracker.allocateSequenceId() == 1
+
+
+def test_request_tracker_retransmits_with_count_then_times_out():
+    sent = []
+    metrics = GenvexNabtoMetrics()
+
+    async def run():
+        tracker = GenvexNabtoRequestTracker(sent.append, timeout=0.01, retransmissions=2, metrics=metrics)
+        request = tracker.track(GenvexNabtoRequestKind.PING, lambda seq, count: bytes([seq, count]))
+        try:
+            await request.future
+        except asyncio.TimeoutError:
+            return True
+        return False
+
+    assert asyncio.run(run())
+    assert sent == [bytes([1, 0]), bytes([1, 1]), bytes([1, 2])]
+    assert metrics.packetsSent["ping"] == 3
+    assert metrics.retransmits["ping"] == 2
+    assert metrics.timeouts["ping"] == 1
+    assert "ping" not in metrics.rtt
+
+
+def test_histogram_buckets_and_metrics_snapshot():
+    histogram = GenvexNabtoHistogram(bounds=(10, 100))
+    for value in (1, 10, 50, 500):
+        histogram.observe(value)
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.mean() == 140.25
+    assert histogram.asDict()["buckets"] == {"le_10": 2, "le_100": 1, "inf": 1}
+
+    metrics = GenvexNabtoMetrics()
+    assert metrics.getDataAge() is None
+    metrics.recordConnect()
+    metrics.recordConnect()
+    metrics.recordRtt("datapoints", 0.02)
+    metrics.recordData(100.0)
+    snapshot = metrics.asDict(now=130.0)
+    assert snapshot["connects"] == 2 and snapshot["reconnects"] == 1
+    assert snapshot["data_age"] == 30.0
+    assert snapshot["rtt_ms"]["datapoints"]["mean"] == 20.0
+
+
+def test_request_tracker_resolve_stops_retransmission():
+    sent = []
+
+    async def run():
+        tracker = GenvexNabtoRequestTracker(sent.append, timeout=0.01)
+        request = tracker.track(GenvexNabtoRequestKind.DATAPOINTS, lambda seq, count: bytes([seq, count]), listId=100)
+        assert tracker.hasPending(GenvexNabtoRequestKind.DATAPOINTS, 100)
+        assert tracker.resolve(request.sequenceId) is request
+        await asyncio.sleep(0.05)
+        assert not tracker.hasPending(GenvexNabtoRequestKind.DATAPOINTS, 100)
+
+    asyncio.run(run())
+    assert sent == [bytes([1, 0])]
+
+
+def test_classify_datapoint_tiers():
+    from genvexnabto.genvexnabto_scheduler import GenvexNabtoPollTier, classifyDatapoint
+
+    assert classifyDatapoint("fan_rpm_supply") == GenvexNabtoPollTier.FAST
+    assert classifyDatapoint("co2_level") == GenvexNabtoPollTier.FAST
+    assert classifyDatapoint("temp_supply") == GenvexNabtoPollTier.MEDIUM
+    assert classifyDatapoint("filter_days_left") == GenvexNabtoPollTier.SLOW
+    assert classifyDatapoint("alarm_optima270") == GenvexNabtoPollTier.SLOW
+
+
+def test_poll_scheduler_backs_off_stable_keys_and_restores_on_change():
+    from genvexnabto.const import DATAPOINT_STABLE_POLLS
+    from genvexnabto.genvexnabto_scheduler import GenvexNabtoPollScheduler
+
+    scheduler = GenvexNabtoPollScheduler(["fan_rpm_supply", "temp_supply"])
+    assert scheduler.getRequestLists() == {100: ["fan_rpm_supply"], 101: ["temp_supply"]}
+
+    for _ in range(DATAPOINT_STABLE_POLLS):
+        scheduler.observe("fan_rpm_supply", False)
+    assert scheduler.getRequestLists() == {101: ["fan_rpm_supply", "temp_supply"]}
+
+    assert scheduler.observe("fan_rpm_supply", True)
+    assert scheduler.getRequestLists() == {100: ["fan_rpm_supply"], 101: ["temp_supply"]}
+
+    # A whole response of unchanged keys is recorded at once
+    assert [scheduler.observeUnchanged(["fan_rpm_supply", "temp_supply"]) for _ in range(DATAPOINT_STABLE_POLLS)][-1]
+    assert scheduler.getRequestLists() == {101: ["fan_rpm_supply"], 102: ["temp_supply"]}
+
+
+def test_poll_scheduler_due_lists_follow_intervals():
+    from genvexnabto.genvexnabto_scheduler import GenvexNabtoPollScheduler
+
+    scheduler = GenvexNabtoPollScheduler(["fan_rpm_supply", "temp_supply"])
+    scheduler.setIntervals(fast=5, medium=60)
+    assert scheduler.getDueLists(1000.0) == [100, 101]
+    scheduler.markUpdated(100, 1000.0)
+    scheduler.markUpdated(101, 1000.0)
+    assert scheduler.getDueLists(1004.0) == []
+    assert scheduler.getDueLists(1006.0) == [100]
+    assert scheduler.nextDue() == 1005.0
+
+
+def test_deadband_classes_and_heartbeat():
+    from genvexnabto.genvexnabto_deadband import GenvexNabtoDeadband, GenvexNabtoKeyClass, classifyKey
+
+    assert classifyKey("temp_supply") == GenvexNabtoKeyClass.TEMPERATURE
+    assert classifyKey("fan_rpm_supply") == GenvexNabtoKeyClass.RPM
+    assert classifyKey("filter_days_left") == GenvexNabtoKeyClass.DAYS
+    assert classifyKey("alarm_optima270") == GenvexNabtoKeyClass.OTHER
+
+    deadband = GenvexNabtoDeadband(heartbeat=600)
+    assert not deadband.isSignificant("temp_supply", 21.5, 21.6, 10)
+    assert deadband.isSignificant("temp_supply", 21.5, 21.3, 10)
+    assert deadband.isSignificant("temp_supply", 21.5, 21.6, 600)
+    assert not deadband.isSignificant("temp_supply", 21.5, 21.5, 600)
+    # RPM uses the larger of 10 rpm and 2 %
+    assert not deadband.isSignificant("fan_rpm_supply", 2000, 2030, 10)
+    assert deadband.isSignificant("fan_rpm_supply", 2000, 2040, 10)
+    assert deadband.isSignificant("alarm_optima270", 0, 1, 0)
+
+    deadband.setDeadbands({GenvexNabtoKeyClass.TEMPERATURE: (1, 0), "temp_extract": (0, 0)}, heartbeat=0)
+    assert deadband.getDeadband("temp_supply") == (1, 0)
+    assert deadband.isSignificant("temp_extract", 21.5, 21.6, 0)
+
+
+def test_adapter_only_publishes_changes_beyond_the_deadband(monkeypatch):
+    from genvexnabto.genvexnabto_modeladapter import GenvexNabtoModelAdapter, time
+
+    adapter = GenvexNabtoModelAdapter(1140, 0, 2763306, 3)
+    keys = ["temp_supply"]
+    decoder = adapter.getDatapointDecoder(keys)
+    updates = []
+    adapter.registerUpdateHandler("temp_supply", lambda old, new: updates.append((old, new)))
+
+    def receive(now, temperature):
+        raw = round(temperature * decoder.dividers[0]) - decoder.offsets[0]
+        monkeypatch.setattr(time, "time", lambda: now)
+        adapter.decodeDatapoints(keys, (1).to_bytes(2, "big") + raw.to_bytes(2, "big", signed=True))
+
+    receive(1000, 21.5)
+    receive(1010, 21.6)
+    receive(1020, 21.5)
+    assert updates == [(None, 21.5)] and adapter.getPublishedValue("temp_supply") == 21.5
+    receive(1025, 21.6)
+    # Reads get the latest value, inside the deadband or not
+    assert adapter.getValue("temp_supply") == 21.6
+    receive(1030, 21.8)
+    assert updates[1:] == [(21.5, 21.8)] and adapter.getPublishedValue("temp_supply") == 21.8
+    # Inside the deadband, but the heartbeat since the last publish has passed
+    receive(1700, 21.7)
+    assert updates[-1] == (21.8, 21.7)
+    # A repeated raw value still publishes a change held back by the deadband once the heartbeat passes
+    receive(1710, 21.8)
+    receive(1720, 21.8)
+    assert updates[-1] == (21.8, 21.7) and adapter.getValue("temp_supply") == 21.8
+    receive(2400, 21.8)
+    assert updates[-1] == (21.7, 21.8)
+
+
+def test_adapter_publishes_the_first_value_of_a_key_reported_by_a_later_poll():
+    from genvexnabto.genvexnabto_modeladapter import GenvexNabtoModelAdapter
+
+    adapter = GenvexNabtoModelAdapter(1140, 0, 2763306, 3)
+    updates = []
+    for key in ("temp_supply", "temp_outside", "temp_setpoint"):
+        adapter.registerUpdateHandler(key, lambda old, new, key=key: updates.append((key, old, new)))
+
+    def payload(decoder, *values):
+        raws = [round(value * divider) - offset for value, divider, offset in zip(values, decoder.dividers, decoder.offsets)]
+        return len(raws).to_bytes(2, "big") + b"".join(raw.to_bytes(2, "big", signed=True) for raw in raws)
+
+    first, later = ["temp_supply"], ["temp_supply", "temp_outside"]
+    adapter.decodeDatapoints(first, payload(adapter.getDatapointDecoder(first), 21.5))
+    assert updates == [("temp_supply", None, 21.5)]
+    # temp_outside is only polled from the second poll on
+    adapter.decodeDatapoints(later, payload(adapter.getDatapointDecoder(later), 21.5, 5.2))
+    assert updates[1:] == [("temp_outside", None, 5.2)]
+    setpoints = ["temp_setpoint"]
+    adapter.decodeSetpoints(setpoints, b"\x00" + payload(adapter.getSetpointDecoder(setpoints), 21.5))
+    assert updates[2:] == [("temp_setpoint", None, 21.5)]
+    adapter.decodeSetpoints(setpoints, b"\x00" + payload(adapter.getSetpointDecoder(setpoints), 21.5))
+    assert len(updates) == 3
+
+
+def test_value_decoder_scales_signed_and_unsigned_values():
+    from genvexnabto.genvexnabto_decoder import GenvexNabtoValueDecoder
+
+    definitions = [{"offset": 0, "divider": 10}, {"offset": -300, "divider": 10}, {"offset": 0, "divider": 1}]
+    payload = b"\x00\x03" + (215).to_bytes(2, "big") + (520).to_bytes(2, "big") + (-2).to_bytes(2, "big", signed=True)
+
+    signed = GenvexNabtoValueDecoder(["a", "b", "c"], definitions, signed=True)
+    assert signed.decode(payload, 2, 3) == [21.5, 22.0, -2]
+    assert isinstance(signed.decode(payload, 2, 3)[2], int)
+
+    unsigned = GenvexNabtoValueDecoder(["a", "b", "c"], definitions, signed=False)
+    assert unsigned.decode(payload, 2, 3)[2] == 0xFFFE
+    # A short response only yields the values it carries
+    assert signed.decode(payload[:6], 2, 3) == [21.5, 22.0]
+
+
+def test_history_ring_buffer_wraps_and_answers_windowed_queries():
+    from genvexnabto.genvexnabto_history import GenvexNabtoHistory
+
+    history = GenvexNabtoHistory(retention=100, maxSamples=4)
+    for second, raw in enumerate((200, 210, -50, 230, 240, 220)):
+        history.record(1000 + second, ["temp", "fan"], [raw, second], [0, 0], [10, 1])
+
+    assert sorted(history.getKeys()) == ["fan", "temp"]
+    # Only the newest four samples survive the wrap-around, and values come back scaled
+    assert history.getLast("temp", 10, now=1005) == [(1002, -5.0), (1003, 23.0), (1004, 24.0), (1005, 22.0)]
+    assert history.getLast("temp", 2, now=1005) == [(1004, 24.0), (1005, 22.0)]
+    assert history.getStats("temp", now=1005) == {"count": 4, "min": -5.0, "max": 24.0, "mean": 16.0, "last": 22.0}
+    assert history.getStats("temp", window=1, now=1005) == {"count": 2, "min": 22.0, "max": 24.0, "mean": 23.0, "last": 22.0}
+    assert history.getStats("fan", window=1, now=1005)["last"] == 5
+    # Nothing inside the retention window, and unknown keys
+    assert history.getStats("temp", now=2000) is None
+    assert history.getStats("missing") is None and history.getLast("missing", 3) == []
+    assert history.asDict() == {"retention": 100, "max_samples": 4, "keys": 2, "samples": 8, "bytes": 48}
+
+
+def test_packet_builder_matches_generic_packet_and_tracks_server_id():
+    from genvexnabto.protocol import GenvexCommandPing, GenvexPacket, GenvexPacketBuilder, GenvexPacketType, GenvexPayloadCrypt
+
+    command = GenvexCommandPing().buildCommand()
+    payload = GenvexPayloadCrypt()
+    payload.setData(command)
+    builder = GenvexPacketBuilder(b"\x01\x02\x03\x04")
+    builder.setServerId(b"\x05\x06\x07\x08")
+
+    expected = GenvexPacket.build_packet(b"\x01\x02\x03\x04", b"\x05\x06\x07\x08", GenvexPacketType.DATA, 513, [payload], 2)
+    assert builder.buildDataPacket(513, command, 2) == expected
+
+
+def test_packet_template_patches_sequence_and_checksum():
+    from genvexnabto.protocol import GenvexCommandPing, GenvexPacketBuilder, GenvexPacketTemplate
+
+    command = GenvexCommandPing().buildCommand()
+    builder = GenvexPacketBuilder(b"\x01\x02\x03\x04", b"\xff\xff\xff\xff")
+    template = GenvexPacketTemplate(builder.buildDataPacket(0, command))
+
+    for sequence_id, retransmissions in ((1, 0), (0xFFFF, 3), (0x1234, 1)):
+        assert template.render(sequence_id, retransmissions) == builder.buildDataPacket(sequence_id, command, retransmissions)
+    # A rendered packet is not changed by the next render
+    first = template.render(1)
+    template.render(2, 1)
+    assert first == builder.buildDataPacket(1, command)
+
+
+def test_hub_routes_by_client_id_and_fans_out_discovery():
+    from genvexnabto import GenvexNabto, GenvexNabtoHub
+
+    async def run():
+        hub = GenvexNabtoHub()
+        first, second = GenvexNabto("a@example.com", hub=hub), GenvexNabto("b@example.com", hub=hub)
+        await first.startListening()
+        await second.startListening()
+        assert hub.getClientCount() == 2
+
+        discovery = b"\x00\x80\x00\x01" + bytes(15) + b"unit.remote.lscontrol.dk\x00"
+        hub.processReceivedMessage(discovery, ("10.0.0.7", 5570))
+        assert first._discovered_devices == second._discovered_devices == {"unit.remote.lscontrol.dk": ("10.0.0.7", 5570)}
+
+        rejected = first._client_id + bytes(4) + b"\x83" + bytes(11) + bytes(8)
+        hub.processReceivedMessage(rejected, ("10.0.0.7", 5570))
+        assert first._connection_error and not second._connection_error
+
+        first.stopListening()
+        assert hub.getClientCount() == 1 and hub._transport is not None
+        second.stopListening()
+        assert hub._transport is None
+
+    asyncio.run(run())
+
+
+def test_discovery_cache_round_trips_and_gives_up_on_failing_address(tmp_path):
+    from genvexnabto import GenvexNabtoDiscoveryCache
+    from genvexnabto.const import DISCOVERY_REBROADCAST_AFTER
+
+    cache = GenvexNabtoDiscoveryCache(ttl=60)
+    cache.update("unit.remote.lscontrol.dk", "10.0.0.7", 5570, now=1000.0)
+    assert not cache.isStale("unit.remote.lscontrol.dk", now=1030.0)
+    assert cache.isStale("unit.remote.lscontrol.dk", now=1100.0)
+
+    path = tmp_path / "discovery_cache.json"
+    cache.save(path)
+    loaded = GenvexNabtoDiscoveryCache()
+    assert loaded.load(path)
+    assert loaded.get("unit.remote.lscontrol.dk")["ip"] == "10.0.0.7"
+
+    for _ in range(DISCOVERY_REBROADCAST_AFTER):
+        loaded.recordConnectFailure("unit.remote.lscontrol.dk")
+    assert not loaded.isUsable("unit.remote.lscontrol.dk")
+    loaded.update("unit.remote.lscontrol.dk", "10.0.0.8", 5570)
+    assert loaded.isUsable("unit.remote.lscontrol.dk")
+
+
+def test_client_uses_cached_address_without_broadcasting():
+    from genvexnabto import GenvexNabto, GenvexNabtoDiscoveryCache
+
+    async def run():
+        cache = GenvexNabtoDiscoveryCache()
+        cache.update("unit.remote.lscontrol.dk", "10.0.0.7", 5571)
+        client = GenvexNabto("a@example.com", discoveryCache=cache)
+        sent = []
+        client.sendPacket = lambda packet, address: sent.append(address) or True
+        client.setDevice("unit.remote.lscontrol.dk")
+        assert await client.waitForDiscovery(timeout=0.01)
+        assert (client._device_ip, client._device_port) == ("10.0.0.7", 5571)
+        assert sent == []
+
+    asyncio.run(run())
+
+
+def test_cached_fingerprint_loads_model_before_ping_answers():
+    from genvexnabto import GenvexNabto, GenvexNabtoDiscoveryCache
+
+    cts602 = (1140, 0, 2763306, 3)
+
+    def ping_payload(model, device_number, slave_number, slave_model):
+        return bytes(4) + device_number.to_bytes(4, "big") + model.to_bytes(4, "big") + bytes(4) + slave_number.to_bytes(4, "big") + slave_model.to_bytes(4, "big")
+
+    async def run():
+        cache = GenvexNabtoDiscoveryCache()
+        cache.update("unit.remote.lscontrol.dk", "10.0.0.7", 5570)
+        cache.setFingerprint("unit.remote.lscontrol.dk", cts602)
+        client = GenvexNabto("a@example.com", discoveryCache=cache)
+        sent = []
+        client._requests._send = lambda packet: sent.append(packet) or True
+        client.setDevice("unit.remote.lscontrol.dk")
+
+        connected = client._client_id + bytes(4) + b"\x83" + bytes(11) + b"\x00\x00\x00\x01" + b"\x0a\x0b\x0c\x0d"
+        client.processReceivedMessage(connected, ("10.0.0.7", 5570))
+        adapter = client._model_adapter
+        assert adapter is not None and adapter.getModelName()
+        commands = [packet[25] for packet in sent]
+        assert 0x2D in commands and 0x2A in commands and commands[-1] == 0x11
+
+        client.processPingPayload(ping_payload(*cts602))
+        assert client._model_adapter is adapter
+
+        client.processPingPayload(ping_payload(1140, 0, 2763306, 2))
+        assert client._model_adapter is not adapter
+        assert cache.getFingerprint("unit.remote.lscontrol.dk") == (1140, 0, 2763306, 2)
+        client.stopListening()
+
+    asyncio.run(run())
+
+
+def test_model_registry_resolves_fingerprints_to_shared_frozen_models():
+    import pytest
+
+    from genvexnabto.models import GenvexNabtoCTS602, GenvexNabtoCTS602Light, GenvexNabtoOptima270, loadModel, lookupModel
+
+    assert lookupModel(2010, 79265, 0, 0) is GenvexNabtoOptima270
+    assert lookupModel(1141, 0, 2763306, 2) is GenvexNabtoCTS602Light
+    assert lookupModel(1140, 0, 2763306, 7) is GenvexNabtoCTS602
+    assert lookupModel(2010, 1, 0, 0) is None
+
+    model = loadModel(1140, 0, 2763306, 3)
+    assert model is loadModel(1141, 5, 2763306, 3)
+    record = model._datapoints["temp_supply"]
+    assert record["divider"] == record.divider
+    with pytest.raises(TypeError):
+        model._datapoints["temp_supply"] = record
+
+
+def test_models_are_imported_only_for_the_matched_fingerprint():
+    import subprocess
+    import sys
+    from pathlib import Path
+
+    script = (
+        "import sys; sys.path.insert(0, 'vendor')\n"
+        "from genvexnabto.genvexnabto_modeladapter import GenvexNabtoModelAdapter\n"
+        "loaded = lambda: sorted(m for m in sys.modules if m.startswith('genvexnabto.models.') and m[19:] not in ('basemodel', 'registry'))\n"
+        "assert loaded() == [], loaded()\n"
+        "assert GenvexNabtoModelAdapter.providesModel(2010, 79265, 0, 0) and loaded() == []\n"
+        "GenvexNabtoModelAdapter(2010, 79265, 0, 0)\n"
+        "assert loaded() == ['genvexnabto.models.optima270'], loaded()\n"
+        "from genvexnabto.models import MODEL_MODULES, importModelClasses\n"
+        "importModelClasses()\n"
+        "assert loaded() == sorted('genvexnabto.models.' + m for m in MODEL_MODULES.values()), loaded()\n"
+    )
+    subprocess.run([sys.executable, "-c", script], cwd=Path(__file__).resolve().parents[1], check=True)
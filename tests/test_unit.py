@@ -67,3 +67,10 @@ def test_resolve_nabto_params_requires_email():
         return
     raise AssertionError("Expected SystemExit for missing email")
 
+
+
+def test_resolve_fleet_gateways_prefers_list_then_single_gateway():
+    gateways = [{"host": "192.168.0.42"}, {"device_id": "unit.remote.lscontrol.dk"}]
+    assert nilan_comm._resolve_fleet_gateways({"gateways": gateways, "gateway": {"host": "ignored"}}) == gateways
+    assert nilan_comm._resolve_fleet_gateways({"gateway": {"host": "192.168.0.42"}}) == [{"host": "192.168.0.42"}]
+    assert nilan_comm._resolve_fleet_gateways({"gateway": {"host": "", "device_id": ""}}) == []